@@ -0,0 +1,331 @@
+"""
+JSON/HTTP booking API for integrations (partners, phone IVR).
+
+- Plain asyncio server, standard library only; nothing here imports Streamlit
+- Same reservations table, pool, capacity checks and validation as the chat
+- Blocking SQLite calls run on a small thread pool, and a semaphore bounds how
+  many requests touch the database at once
+
+    python api.py --port 8502
+
+Routes:
+
+    GET    /health
+    GET    /reservations?date_from=&date_to=&name=&limit=&after=   (keyset paging)
+    GET    /reservations?q=<name, email or phone>                 (ranked search)
+    POST   /reservations          (Idempotency-Key header: a retry returns the first result;
+                                   the same key with another body is a 422)
+    GET    /reservations/<id>
+    PATCH  /reservations/<id>     (PUT also accepted)
+    DELETE /reservations/<id>
+    GET    /venues
+    GET    /report?date_from=&date_to=     (bookings and covers per day, every venue)
+
+Every route except /venues and /report also works under /venues/<slug>/...
+for one restaurant; without the prefix it is the first configured venue.
+"""
+
+import argparse
+import asyncio
+import datetime
+import functools
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import archive
+import db
+import metrics
+import notifier
+import venues
+from capacity import FullyBooked
+from validation import InvalidReservation, validate_reservation
+
+MAX_BODY = 64 * 1024
+MAX_PAGE = 200
+READ_TIMEOUT = 30
+
+_ID_RE = re.compile(r"^/reservations/(\d+)$")
+_VENUE_RE = re.compile(r"^/venues/([^/]+)(/.*)$")
+
+REASONS = {
+    200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 422: "Unprocessable Entity",
+    500: "Internal Server Error",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str, details: dict = None):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def validate(data, partial: bool = False) -> dict:
+    venue = venues.current()
+    try:
+        return validate_reservation(data, partial=partial, opening=venue.opening, closing=venue.closing)
+    except InvalidReservation as e:
+        raise ApiError(400, "Invalid reservation.", e.errors)
+
+
+# ---------- Handlers (run on the worker threads) ----------
+
+def create_reservation(body, idempotency_key: str = None) -> tuple:
+    r = validate(body)
+    try:
+        new_id = db.save_reservation(r, idempotency_key=idempotency_key)
+    except FullyBooked:
+        raise ApiError(409, f"Fully booked at {r['time']} on {r['date']}.")
+    except db.DuplicateBooking as e:
+        raise ApiError(409, f"Already booked as reservation {e.reservation_id}.")
+    except db.IdempotencyKeyReused:
+        raise ApiError(422, "This Idempotency-Key was already used for a different reservation.")
+    # why: on a replay this is the booking the key first created, not the body of the retry
+    saved = db.get_reservation(new_id)
+    if saved is None:
+        raise ApiError(404, f"Reservation {new_id} not found.")
+    return 201, saved
+
+
+def read_reservation(rid: int) -> tuple:
+    r = db.get_reservation(rid)
+    if r is None:
+        raise ApiError(404, f"Reservation {rid} not found.")
+    return 200, r
+
+
+def patch_reservation(rid: int, body) -> tuple:
+    changes = validate(body, partial=True)
+    current = db.get_reservation(rid)
+    if current is None:
+        raise ApiError(404, f"Reservation {rid} not found.")
+    if current.pop('archived', False):
+        raise ApiError(409, f"Reservation {rid} is archived and can no longer be changed.")
+    r = {**current, **changes}
+    try:
+        updated = db.update_reservation(r)
+    except FullyBooked:
+        raise ApiError(409, f"Fully booked at {r['time']} on {r['date']}.")
+    except db.DuplicateBooking as e:
+        raise ApiError(409, f"The guest already has reservation {e.reservation_id} at that time.")
+    if not updated:
+        raise ApiError(404, f"Reservation {rid} not found.")  # cancelled since it was read
+    # why: the update re-seats the party; r still carries the tables it had before
+    return 200, db.get_reservation(rid)
+
+
+def cancel_reservation(rid: int) -> tuple:
+    if not db.delete_reservation(rid):
+        if db.get_reservation(rid) is not None:
+            raise ApiError(409, f"Reservation {rid} is archived and can no longer be changed.")
+        raise ApiError(404, f"Reservation {rid} not found.")
+    return 204, None
+
+
+def list_reservations(query: dict) -> tuple:
+    def arg(name):
+        values = query.get(name)
+        return values[-1] if values else None
+
+    try:
+        limit = max(1, min(MAX_PAGE, int(arg('limit') or 50)))
+    except ValueError:
+        raise ApiError(400, "limit must be an integer.")
+    after = None
+    if arg('after'):
+        # why: the cursor is the (date, time, id) key of the last row, as returned in `next`
+        try:
+            date, hhmm, rid = arg('after').split(',')
+            after = (date, hhmm, int(rid))
+        except ValueError:
+            raise ApiError(400, "after must be a cursor returned as `next`.")
+    if arg('q'):
+        rows = db.search_reservations(arg('q'), limit=limit, date_from=arg('date_from'), date_to=arg('date_to'))
+        return 200, {'reservations': rows, 'next': None}
+    rows = db.get_reservations_page(
+        after=after, limit=limit + 1, date_from=arg('date_from'), date_to=arg('date_to'), name=arg('name')
+    )
+    more = len(rows) > limit
+    rows = rows[:limit]
+    last = rows[-1] if rows else None
+    return 200, {
+        'reservations': rows,
+        'next': f"{last['date']},{last['time']},{last['id']}" if more else None,
+    }
+
+
+def list_venues() -> tuple:
+    return 200, {'venues': [
+        {'slug': v.slug, 'name': v.name, 'address': v.address, 'phone': v.phone,
+         'opening': f"{v.opening:%H:%M}", 'closing': f"{v.closing:%H:%M}", 'days': v.days}
+        for v in venues.all_venues()
+    ]}
+
+
+def group_report(query: dict) -> tuple:
+    today = datetime.date.today()
+    date_from = (query.get('date_from') or [today.isoformat()])[-1]
+    date_to = (query.get('date_to') or [(today + datetime.timedelta(days=30)).isoformat()])[-1]
+    return 200, venues.report(date_from, date_to)
+
+
+def route(method: str, path: str, query: dict, body, headers: dict = None):
+    """(route name, zero-arg callable) for a request; raises ApiError(404/405)."""
+    if path == '/health':
+        if method != 'GET':
+            raise ApiError(405, "Use GET.")
+        return 'health', lambda: (200, {'status': 'ok', 'write_version': db.get_write_version()})
+    if path in ('/venues', '/report'):
+        if method != 'GET':
+            raise ApiError(405, "Use GET.")
+        if path == '/venues':
+            return 'venues', list_venues
+        return 'report', lambda: group_report(query)
+    if path == '/reservations':
+        if method == 'GET':
+            return 'list', lambda: list_reservations(query)
+        if method == 'POST':
+            key = (headers or {}).get('idempotency-key')
+            return 'create', lambda: create_reservation(body, key)
+        raise ApiError(405, "Use GET or POST.")
+    match = _ID_RE.match(path)
+    if match:
+        rid = int(match.group(1))
+        if method == 'GET':
+            return 'get', lambda: read_reservation(rid)
+        if method in ('PATCH', 'PUT'):
+            return 'update', lambda: patch_reservation(rid, body)
+        if method == 'DELETE':
+            return 'cancel', lambda: cancel_reservation(rid)
+        raise ApiError(405, "Use GET, PATCH or DELETE.")
+    raise ApiError(404, "No such route.")
+
+
+# ---------- HTTP server ----------
+
+class BookingApi:
+    def __init__(self, workers: int = db.POOL_SIZE):
+        # why: more DB threads than pooled connections would only queue inside the pool
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-db")
+        self.limit = asyncio.Semaphore(workers)
+
+    async def dispatch(self, method: str, target: str, body: bytes, headers: dict = None):
+        url = urlsplit(target)
+        try:
+            payload = json.loads(body) if body else None
+        except ValueError:
+            return 400, {'error': "Body is not valid JSON."}
+        try:
+            venue, path = venues.get_venue(), url.path
+            match = _VENUE_RE.match(path)
+            if match:
+                if match.group(1) not in venues.VENUES:
+                    raise ApiError(404, f"No venue {match.group(1)!r}.")
+                venue, path = venues.get_venue(match.group(1)), match.group(2)
+            name, call = route(method, path, parse_qs(url.query), payload, headers)
+            # why: run_in_executor does not carry contextvars, so the venue is activated on the worker
+            call = functools.partial(venues.run_in, venue, call)
+            with metrics.span('api_request_seconds', route=name):
+                async with self.limit:
+                    return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+        except ApiError as e:
+            error = {'error': str(e)}
+            if e.details:
+                error['fields'] = e.details
+            return e.status, error
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+                except asyncio.TimeoutError:
+                    return
+                if not request_line.strip():
+                    return
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.respond(writer, 400, {'error': "Malformed request line."}, keep_alive=False)
+                    return
+                try:
+                    headers = await asyncio.wait_for(self.read_headers(reader), READ_TIMEOUT)
+                except asyncio.TimeoutError:
+                    return
+                length = headers.get('content-length') or '0'
+                # why: int() would also take "-1" or " 1_0", and a ValueError here would drop the connection unanswered
+                if not (length.isascii() and length.isdecimal()):
+                    await self.respond(writer, 400, {'error': "Invalid Content-Length."}, keep_alive=False)
+                    return
+                length = int(length)
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {'error': "Body too large."}, keep_alive=False)
+                    return
+                try:
+                    body = await asyncio.wait_for(reader.readexactly(length), READ_TIMEOUT) if length else b''
+                except asyncio.TimeoutError:
+                    return
+                try:
+                    status, payload = await self.dispatch(method.upper(), target, body, headers)
+                except Exception as e:
+                    status, payload = 500, {'error': f"{type(e).__name__}: {e}"}
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' and (version == 'HTTP/1.1' or connection == 'keep-alive')
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def read_headers(reader: asyncio.StreamReader) -> dict:
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                return headers
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+    async def respond(self, writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool):
+        body = b'' if payload is None else json.dumps(payload).encode()
+        head = [
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if body:
+            head.append("Content-Type: application/json")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8502):
+        # why: open every shard's pool (and migrate) before the first request, not inside it
+        await asyncio.get_running_loop().run_in_executor(self.executor, venues.fan_out, db.ensure_db)
+        archive.start_scheduler(job=venues.maintain_all)
+        notifier.start_worker()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the booking JSON API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--workers', type=int, default=db.POOL_SIZE, help='concurrent database calls')
+    args = parser.parse_args(argv)
+    print(f"Booking API on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(BookingApi(workers=args.workers).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Hot/cold split for reservations.
+
+- Bookings older than ARCHIVE_AFTER_DAYS move from `reservations` to
+  `reservations_archive` (same IDs), in small batches so writers are never
+  blocked for long; their occupancy rows are dropped
+- Maintenance (archive, expiring idempotency keys, PRAGMA optimize,
+  incremental vacuum) runs at most once per MAINTENANCE_HOURS across all
+  processes; the last run is recorded in meta
+- db.get_reservation reads through to the archive for old IDs
+
+    python archive.py            # run maintenance now
+"""
+
+import argparse
+import datetime
+import logging
+import os
+import threading
+import time
+
+import db
+import metrics
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('RESERVATIONS_ARCHIVE_DAYS', 30))
+MAINTENANCE_HOURS = float(os.environ.get('RESERVATIONS_MAINTENANCE_HOURS', 24))
+BATCH_SIZE = 2000
+VACUUM_PAGES = 2000  # free pages returned to the OS per maintenance run
+IDEMPOTENCY_KEY_HOURS = 24  # how long a retried confirm still gets its first answer
+ANALYSIS_LIMIT = 400  # rows sampled per index when PRAGMA optimize re-analyzes
+
+log = logging.getLogger(__name__)
+
+_SELECT_BATCH = "SELECT id FROM reservations WHERE date < ? ORDER BY date, time, id LIMIT ?"
+
+
+def cutoff(days: int = ARCHIVE_AFTER_DAYS, today: datetime.date = None) -> str:
+    return ((today or datetime.date.today()) - datetime.timedelta(days=days)).isoformat()
+
+
+def archive_before(date: str, batch_size: int = BATCH_SIZE) -> int:
+    """Move reservations dated before `date` to the archive; returns how many moved."""
+    moved = 0
+    while True:
+        with db.transaction() as conn:
+            ids = [row[0] for row in conn.execute(_SELECT_BATCH, (date, batch_size))]
+            if not ids:
+                # why: nothing in the past is booked any more, so its occupancy and notices are dead weight
+                conn.execute("DELETE FROM occupancy WHERE date < ?", (date,))
+                conn.execute("DELETE FROM notifications_sent WHERE date < ?", (date,))
+                break
+            placeholders = ",".join("?" * len(ids))
+            conn.execute(
+                f"INSERT OR REPLACE INTO reservations_archive ({db.ARCHIVE_COLUMNS}, archived_at) "
+                f"SELECT {db.ARCHIVE_COLUMNS}, datetime('now') FROM reservations WHERE id IN ({placeholders})",
+                ids,
+            )
+            conn.execute(f"DELETE FROM reservations WHERE id IN ({placeholders})", ids)
+        moved += len(ids)
+    metrics.count('archived_rows_total', moved)
+    return moved
+
+
+def expire_idempotency_keys(hours: float = IDEMPOTENCY_KEY_HOURS) -> int:
+    with db.transaction() as conn:
+        return conn.execute(
+            "DELETE FROM idempotency_keys WHERE created_at < datetime('now', ?)", (f"-{hours} hours",)
+        ).rowcount
+
+
+def optimize():
+    """Refresh stale planner statistics and hand free pages back to the filesystem."""
+    with db.connection() as conn:
+        # why: optimize only re-analyzes tables that changed enough, and the limit keeps that to a sample
+        conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        conn.execute("PRAGMA optimize")
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:  # INCREMENTAL
+            conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})")
+
+
+def enable_incremental_vacuum():
+    """Switch an existing database to auto_vacuum=INCREMENTAL (one full VACUUM; run off-peak)."""
+    with db.connection() as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+
+
+def _claim(interval_hours: float) -> bool:
+    """Record this run in meta unless another process ran maintenance within the interval."""
+    now = int(time.time())
+    with db.transaction() as conn:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'last_maintenance'").fetchone()
+        if row is not None and now - row[0] < interval_hours * 3600:
+            return False
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_maintenance', ?)", (now,))
+    return True
+
+
+@metrics.timed('maintenance_seconds')
+def maintain(days: int = ARCHIVE_AFTER_DAYS, interval_hours: float = 0) -> int:
+    """Archive old bookings and optimize; returns rows archived, or -1 if it ran too recently."""
+    if not _claim(interval_hours):
+        return -1
+    moved = archive_before(cutoff(days))
+    expire_idempotency_keys()
+    optimize()
+    return moved
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start_scheduler(interval_hours: float = MAINTENANCE_HOURS, check_seconds: float = 600, job=None):
+    """
+    Run maintain() (or `job`, e.g. venues.maintain_all) in a daemon thread
+    whenever it is due; idempotent per process.
+    """
+    global _scheduler
+
+    def loop():
+        while True:
+            try:
+                if job is not None:
+                    job()
+                else:
+                    maintain(interval_hours=interval_hours)
+            except Exception:
+                # why: a busy or read-only database just means we try again next check
+                log.exception("Reservation maintenance failed")
+            time.sleep(check_seconds)
+
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = threading.Thread(target=loop, name="reservations-maintenance", daemon=True)
+            _scheduler.start()
+    return _scheduler
+
+
+def main(argv=None):
+    import venues  # why: venues imports this module
+
+    parser = argparse.ArgumentParser(description="Archive past reservations and optimize the database.")
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS, help='archive bookings older than this')
+    parser.add_argument('--vacuum', action='store_true', help='switch to incremental auto-vacuum (full VACUUM)')
+    parser.add_argument('--db', help='database path (default: RESERVATIONS_DB; use --venue for a venue\'s shard)')
+    parser.add_argument('--venue', choices=list(venues.VENUES), help='maintain this venue (RESTAURANT_VENUES)')
+    args = parser.parse_args(argv)
+    if args.db:
+        db.configure(args.db)
+
+    def run():
+        if args.vacuum:
+            enable_incremental_vacuum()
+        print(f"archived {maintain(days=args.days)} reservations dated before {cutoff(args.days)}")
+
+    if args.venue:
+        # why: its database, and its tables and slot grid, so occupancy is checked against the right floor plan
+        venues.run_in(venues.get_venue(args.venue), run)
+    else:
+        run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+Concurrent-session load test for the booking flow.
+
+Drives the same dialog that backs process_input (greeting -> guests -> date
+-> time -> name -> email -> phone -> special -> confirm) for N simulated
+sessions against a throwaway reservations.db, using threads or processes.
+
+Run from the repo root:
+
+    python -m benchmarks.booking_load --sessions 200 --mode thread
+    python -m benchmarks.booking_load --sessions 200 --mode process --workers 8
+
+Prints a summary and writes machine-readable results (JSON) so runs can be
+compared across commits.
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+from dialog import BookingDialog, DialogState
+
+STEP_ORDER = (
+    'greeting', 'await_intent', 'guests', 'date', 'time',
+    'name', 'email', 'phone', 'special', 'confirm',
+)
+
+
+def session_script(session_no: int, booking_no: int, rng: random.Random):
+    day = datetime.date.today() + datetime.timedelta(days=rng.randint(1, 60))
+    hh, mm = rng.randint(11, 21), rng.choice((0, 15, 30, 45))
+    return [
+        "hi",
+        "I want to book a table",
+        str(rng.randint(1, 8)),
+        day.isoformat(),
+        f"{hh:02d}:{mm:02d}",
+        f"guest {session_no} {booking_no}",
+        f"guest{session_no}.{booking_no}@example.com",
+        f"+1 555 {rng.randint(1000000, 9999999)}",
+        rng.choice(("no", "window seat", "birthday cake")),
+        "confirm",
+    ]
+
+
+def run_sessions(db_path: str, session_ids, bookings: int, seed: int, write_mode: str = 'direct'):
+    """Run a batch of sessions sequentially; returns raw latencies and counters."""
+    db.configure(db_path)
+    db.configure_writes(mode=write_mode)
+    dialog = BookingDialog()
+    latencies = {step: [] for step in STEP_ORDER}
+    counters = {'turns': 0, 'bookings': 0, 'lock_errors': 0, 'errors': 0}
+    for sid in session_ids:
+        rng = random.Random(seed * 1_000_003 + sid)
+        for b in range(bookings):
+            state = DialogState()
+            for text in session_script(sid, b, rng):
+                step = state.current_step
+                start = time.perf_counter()
+                try:
+                    dialog.handle(state, text)
+                except sqlite3.OperationalError as e:
+                    key = 'lock_errors' if 'locked' in str(e) or 'busy' in str(e) else 'errors'
+                    counters[key] += 1
+                    break
+                except Exception:
+                    counters['errors'] += 1
+                    break
+                latencies.setdefault(step, []).append(time.perf_counter() - start)
+                counters['turns'] += 1
+            if state.current_step == 'post_confirmation':
+                counters['bookings'] += 1
+    return latencies, counters
+
+
+def _run_sessions_star(args):
+    return run_sessions(*args)
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def db_size(path: str) -> int:
+    return sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p))
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return 'unknown'
+
+
+def run(args) -> dict:
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='booking-bench-'), 'reservations.db')
+    db.configure(db_path)
+    db.ensure_db()
+    size_before = db_size(db_path)
+
+    workers = args.workers or min(args.sessions, 32)
+    batches = [list(range(w, args.sessions, workers)) for w in range(workers)]
+    jobs = [(db_path, ids, args.bookings, args.seed, args.write_mode) for ids in batches if ids]
+
+    start = time.perf_counter()
+    if args.mode == 'process':
+        with multiprocessing.get_context('spawn').Pool(len(jobs)) as pool:
+            results = pool.map(_run_sessions_star, jobs)
+    else:
+        with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+            results = list(pool.map(_run_sessions_star, jobs))
+    wall = time.perf_counter() - start
+
+    latencies = {step: [] for step in STEP_ORDER}
+    totals = {'turns': 0, 'bookings': 0, 'lock_errors': 0, 'errors': 0}
+    for lat, counters in results:
+        for step, values in lat.items():
+            latencies.setdefault(step, []).extend(values)
+        for key, value in counters.items():
+            totals[key] += value
+
+    steps = {}
+    for step, values in latencies.items():
+        values.sort()
+        steps[step] = {
+            'count': len(values),
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+            'max_ms': (values[-1] if values else 0.0) * 1000,
+        }
+
+    size_after = db_size(db_path)
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'config': {
+            'mode': args.mode,
+            'sessions': args.sessions,
+            'bookings_per_session': args.bookings,
+            'workers': len(jobs),
+            'seed': args.seed,
+            'write_mode': args.write_mode,
+            'db': db_path,
+        },
+        'wall_s': wall,
+        'turns': totals['turns'],
+        'bookings': totals['bookings'],
+        'turns_per_s': totals['turns'] / wall if wall else 0.0,
+        'bookings_per_s': totals['bookings'] / wall if wall else 0.0,
+        'lock_errors': totals['lock_errors'],
+        'errors': totals['errors'],
+        'db_bytes_before': size_before,
+        'db_bytes_after': size_after,
+        'db_bytes_per_booking': (size_after - size_before) / totals['bookings'] if totals['bookings'] else 0.0,
+        'steps': steps,
+    }
+
+
+def print_report(result: dict):
+    cfg = result['config']
+    print(f"{cfg['sessions']} sessions x {cfg['bookings_per_session']} bookings, "
+          f"{cfg['workers']} {cfg['mode']} workers, {cfg['write_mode']} writes, {result['wall_s']:.2f}s")
+    print(f"throughput: {result['turns_per_s']:.0f} turns/s, {result['bookings_per_s']:.1f} bookings/s")
+    print(f"errors: {result['lock_errors']} lock, {result['errors']} other")
+    print(f"db size: {result['db_bytes_before']} -> {result['db_bytes_after']} bytes "
+          f"({result['db_bytes_per_booking']:.0f} B/booking)")
+    print(f"{'step':<14}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for step, s in result['steps'].items():
+        if s['count']:
+            print(f"{step:<14}{s['count']:>8}{s['p50_ms']:>10.3f}{s['p95_ms']:>10.3f}{s['p99_ms']:>10.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sessions', type=int, default=50, help='simulated concurrent sessions')
+    parser.add_argument('--bookings', type=int, default=1, help='bookings per session')
+    parser.add_argument('--mode', choices=('thread', 'process'), default='thread')
+    parser.add_argument('--workers', type=int, default=0, help='threads/processes (default: min(sessions, 32))')
+    parser.add_argument('--db', help='database path (default: a fresh temp file)')
+    parser.add_argument('--write-mode', choices=('direct', 'batched'), default='direct')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench_results.json', help="JSON results file ('-' for stdout only)")
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    print_report(result)
+    if args.output != '-':
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"results written to {args.output}")
+    return 0 if result['errors'] == 0 and result['lock_errors'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,537 @@
+"""
+Table capacity and availability.
+
+- CapacityConfig describes the floor: tables by size, slot length and turn time
+- Every reservation records the tables it was given (its `seating`, e.g. "4"
+  or "2+2"); the occupancy table holds tables in use per (date, slot, table
+  size), and db.py keeps both current inside every reservation write
+- Availability checks read the few occupancy rows a booking would cover, by
+  primary key, so their cost does not grow with the reservations table
+- Suggestions work on a whole day as fixed-width NumPy arrays indexed by slot
+
+Seating rules (CapacityConfig.seatings), tried in this order; a party gets
+the first one with a free table of every size it needs for its whole turn:
+
+1. one table, smallest first
+2. tables of one size pushed together, fewest empty seats first
+3. tables of mixed sizes: the largest first, then the next size down,
+   topped up with the smallest table that seats the rest
+"""
+
+import functools
+import math
+import os
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+import numpy as np
+
+
+class FullyBooked(Exception):
+    """A write would push a slot past the configured tables of some size."""
+
+
+def parse_tables(spec: str) -> tuple:
+    """"2x6,4x8,6x3" -> ((2, 6), (4, 8), (6, 3)): tables as seats x count."""
+    tables = []
+    for part in spec.split(','):
+        if not part.strip():
+            continue
+        try:
+            seats, count = (int(n) for n in part.strip().lower().split('x'))
+        except ValueError:
+            raise ValueError(f"Tables must look like 2x6,4x8 (seats x count): {spec!r}")
+        if seats < 1 or count < 1:
+            raise ValueError(f"Table seats and counts must be positive: {spec!r}")
+        tables.append((seats, count))
+    if not tables:
+        raise ValueError(f"No tables in {spec!r}")
+    return tuple(tables)
+
+
+@dataclass(frozen=True)
+class CapacityConfig:
+    tables: tuple = ((2, 6), (4, 8), (6, 3))  # (seats, count)
+    slot_minutes: int = 15
+    turn_minutes: int = 90
+
+    @functools.cached_property
+    def table_counts(self) -> dict:
+        """{seats: count}, merging repeated sizes."""
+        counts = {}
+        for seats, count in self.tables:
+            counts[seats] = counts.get(seats, 0) + count
+        return counts
+
+    @functools.cached_property
+    def sizes(self) -> tuple:
+        """Table sizes, smallest first."""
+        return tuple(sorted(self.table_counts))
+
+    @property
+    def total_seats(self) -> int:
+        return sum(seats * count for seats, count in self.tables)
+
+    @property
+    def total_tables(self) -> int:
+        return sum(count for _, count in self.tables)
+
+    @property
+    def largest_table(self) -> int:
+        return self.sizes[-1]
+
+    @property
+    def slots_per_turn(self) -> int:
+        return math.ceil(self.turn_minutes / self.slot_minutes)
+
+    @property
+    def slots_per_day(self) -> int:
+        return math.ceil(24 * 60 / self.slot_minutes)
+
+    def seatings(self, guests: int) -> tuple:
+        """Ways to seat a party on an empty floor, in order of preference; each is ((seats, count), ...)."""
+        return _seatings(self, guests)
+
+    def max_party(self) -> int:
+        """The largest party size such that every party up to it can be seated on an empty floor."""
+        return _max_party(self)
+
+    @classmethod
+    def from_env(cls):
+        """RESTAURANT_TABLES="2x6,4x8,6x3", RESTAURANT_SLOT_MINUTES, RESTAURANT_TURN_MINUTES."""
+        default = cls()
+        spec = os.environ.get('RESTAURANT_TABLES')
+        return cls(
+            tables=parse_tables(spec) if spec else default.tables,
+            slot_minutes=int(os.environ.get('RESTAURANT_SLOT_MINUTES', default.slot_minutes)),
+            turn_minutes=int(os.environ.get('RESTAURANT_TURN_MINUTES', default.turn_minutes)),
+        )
+
+
+# ---------- Seating rules ----------
+
+def _largest_first(config: CapacityConfig, guests: int):
+    """Rule 3; None if the floor can't seat the party at all."""
+    counts = config.table_counts
+    remaining, taken = guests, {}
+    for seats in reversed(config.sizes):
+        count = min(counts[seats], remaining // seats)
+        if count:
+            taken[seats] = count
+            remaining -= count * seats
+    if remaining > 0:
+        seats = next((s for s in config.sizes if s >= remaining and taken.get(s, 0) < counts[s]), None)
+        if seats is None:
+            return None
+        taken[seats] = taken.get(seats, 0) + 1
+    return tuple(sorted(taken.items()))
+
+
+@functools.lru_cache(maxsize=1024)
+def _seatings(config: CapacityConfig, guests: int) -> tuple:
+    counts = config.table_counts
+    options = [((seats, 1),) for seats in config.sizes if seats >= guests]
+    joins = []
+    for seats in config.sizes:
+        count = -(-guests // seats)
+        if 2 <= count <= counts[seats]:
+            joins.append((count * seats - guests, count, ((seats, count),)))
+    options += [seating for _, _, seating in sorted(joins)]
+    mixed = _largest_first(config, guests)
+    if mixed is not None and mixed not in options:
+        options.append(mixed)
+    return tuple(options)
+
+
+@functools.lru_cache(maxsize=64)
+def _max_party(config: CapacityConfig) -> int:
+    guests = 0
+    while guests < config.total_seats and config.seatings(guests + 1):
+        guests += 1
+    return guests
+
+
+def parse_seating(text) -> tuple:
+    """"2+2" -> ((2, 2),); empty or missing -> ()."""
+    counts = {}
+    for part in (text or '').split('+'):
+        if part.strip():
+            seats = int(part)
+            counts[seats] = counts.get(seats, 0) + 1
+    return tuple(sorted(counts.items()))
+
+
+def format_seating(seating) -> str:
+    return "+".join(str(seats) for seats, count in seating for _ in range(count))
+
+
+def fallback_seating(config: CapacityConfig, guests: int) -> tuple:
+    """The preferred seating, or for a party the floor can't hold, enough of the largest tables."""
+    options = config.seatings(guests)
+    if options:
+        return options[0]
+    return ((config.largest_table, -(-guests // config.largest_table)),)
+
+
+def recorded_seating(text, guests: int, config: CapacityConfig = None) -> tuple:
+    """A booking's stored seating, or its preferred one if none was stored."""
+    return parse_seating(text) or fallback_seating(config or get_config(), guests)
+
+
+@functools.lru_cache(maxsize=64)
+def over_capacity_sql(config: CapacityConfig) -> str:
+    """SQL condition on an occupancy row: more tables of its size in use than the floor has."""
+    cases = " ".join(f"WHEN {int(seats)} THEN {int(count)}" for seats, count in sorted(config.table_counts.items()))
+    return f"tables > CASE seats {cases} ELSE 0 END"
+
+
+_config = CapacityConfig.from_env()
+
+
+_context_config = ContextVar('capacity_config', default=None)
+
+
+def get_config() -> CapacityConfig:
+    """The floor plan in effect: the one set by use_config() in this context, else the process default."""
+    return _context_config.get() or _config
+
+
+def configure(config: CapacityConfig):
+    global _config
+    _config = config
+
+
+@contextmanager
+def use_config(config: CapacityConfig):
+    """Use another floor plan in this thread/task only (one venue of several)."""
+    token = _context_config.set(config)
+    try:
+        yield config
+    finally:
+        _context_config.reset(token)
+
+
+# ---------- Slot math ----------
+
+def slot_of(hhmm: str, config: CapacityConfig = None) -> int:
+    config = config or get_config()
+    hh, mm = hhmm.split(":")
+    return (int(hh) * 60 + int(mm)) // config.slot_minutes
+
+
+def covered_slots(hhmm: str, config: CapacityConfig = None) -> range:
+    """Slots a booking starting at hhmm keeps its table for."""
+    config = config or get_config()
+    first = slot_of(hhmm, config)
+    return range(first, first + config.slots_per_turn)
+
+
+def slot_time(slot: int, config: CapacityConfig = None) -> str:
+    config = config or get_config()
+    minutes = slot * config.slot_minutes
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+# ---------- Choosing tables ----------
+
+def _fits(usage: dict, slots, seating, config: CapacityConfig, own_slots=(), own: dict = None) -> bool:
+    """Whether `seating` is free in every slot; usage is {(slot, seats): tables in use}."""
+    counts = config.table_counts
+    for slot in slots:
+        for seats, count in seating:
+            in_use = usage.get((slot, seats), 0)
+            if own and slot in own_slots:
+                in_use -= own.get(seats, 0)
+            if in_use + count > counts.get(seats, 0):
+                return False
+    return True
+
+
+def _first_fit(usage: dict, slots, guests: int, config: CapacityConfig, own_slots=(), own: dict = None):
+    return next(
+        (seating for seating in config.seatings(guests) if _fits(usage, slots, seating, config, own_slots, own)),
+        None,
+    )
+
+
+def _own_usage(ignore, date: str, config: CapacityConfig):
+    """Slots and {seats: tables} of a booking being edited, so it doesn't block itself."""
+    if not ignore or ignore.get('date') != date:
+        return set(), {}
+    seating = recorded_seating(ignore.get('seating'), ignore['guests'], config)
+    return set(covered_slots(ignore['time'], config)), dict(seating)
+
+
+def _usage(conn, date: str, first_slot: int, last_slot: int) -> dict:
+    return {
+        (slot, seats): tables
+        for slot, seats, tables in conn.execute(
+            "SELECT slot, seats, tables FROM occupancy WHERE date = ? AND slot BETWEEN ? AND ?",
+            (date, first_slot, last_slot),
+        )
+    }
+
+
+def choose_seating(conn, date: str, hhmm: str, guests: int, ignore: dict = None, config: CapacityConfig = None):
+    """The first seating rule with free tables for the whole turn, or None if the party can't be seated."""
+    config = config or get_config()
+    if guests > config.max_party():
+        return None
+    slots = covered_slots(hhmm, config)
+    usage = _usage(conn, date, slots.start, slots.stop - 1)
+    return _first_fit(usage, slots, guests, config, *_own_usage(ignore, date, config))
+
+
+def _seat_in_memory(day_usage: dict, hhmm: str, guests: int, config: CapacityConfig, overbook: bool = True):
+    """
+    choose_seating against an in-memory day; updates day_usage. A party with
+    no free seating gets an over-capacity one, or None if not `overbook`.
+    """
+    slots = covered_slots(hhmm, config)
+    seating = _first_fit(day_usage, slots, guests, config)
+    if seating is None:
+        if not overbook:
+            return None
+        seating = fallback_seating(config, guests)
+    for slot in slots:
+        for seats, count in seating:
+            day_usage[(slot, seats)] = day_usage.get((slot, seats), 0) + count
+    return seating
+
+
+# ---------- Occupancy index ----------
+
+_UPSERT_SQL = """
+    INSERT INTO occupancy (date, slot, seats, tables) VALUES (?, ?, ?, ?)
+    ON CONFLICT (date, slot, seats) DO UPDATE SET tables = tables + excluded.tables
+"""
+
+
+def ensure_occupancy(conn, config: CapacityConfig = None):
+    """Create the occupancy table and seating column; rebuild them if the slot grid or tables changed."""
+    config = config or get_config()
+    if 'seating' not in {row[1] for row in conn.execute("PRAGMA table_info(reservations)")}:
+        conn.execute("ALTER TABLE reservations ADD COLUMN seating TEXT")
+        conn.execute("DELETE FROM meta WHERE key LIKE 'occupancy_%'")
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(occupancy)")}
+    if columns and 'seats' not in columns:
+        # why: occupancy used to pool every table into one count per slot; it is derived, so rebuild it
+        conn.execute("DROP TABLE occupancy")
+        conn.execute("DELETE FROM meta WHERE key LIKE 'occupancy_%'")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS occupancy (
+            date TEXT NOT NULL,
+            slot INTEGER NOT NULL,
+            seats INTEGER NOT NULL,
+            tables INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (date, slot, seats)
+        ) WITHOUT ROWID
+        """
+    )
+    # why: stored occupancy and seatings are only valid for the slot grid and tables they were built with
+    layout = {
+        'occupancy_slot_minutes': config.slot_minutes,
+        'occupancy_turn_minutes': config.turn_minutes,
+        'occupancy_tables': layout_checksum(config),
+    }
+    stored = dict(conn.execute(
+        f"SELECT key, value FROM meta WHERE key IN ({','.join('?' * len(layout))})", tuple(layout)
+    ).fetchall())
+    if stored != layout:
+        rebuild_occupancy(conn, config=config)
+        conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", layout.items())
+
+
+def layout_checksum(config: CapacityConfig) -> int:
+    """CRC32 of the table layout, e.g. of "2x6,4x8,6x3"; meta values are integers."""
+    spec = ",".join(f"{seats}x{count}" for seats, count in sorted(config.table_counts.items()))
+    return zlib.crc32(spec.encode())
+
+
+def rebuild_occupancy(conn, dates=None, config: CapacityConfig = None, reseat: bool = False):
+    """
+    Recompute occupancy from reservations, for all dates or just `dates`.
+
+    Bookings keep their recorded seating unless it is missing, names a table
+    size the floor no longer has, or `reseat` is set; those are seated again
+    in (date, time, id) order.
+    """
+    config = config or get_config()
+    query = "SELECT id, date, time, guests, seating FROM reservations"
+    if dates is None:
+        conn.execute("DELETE FROM occupancy")
+        rows = conn.execute(query + " ORDER BY date, time, id").fetchall()
+    else:
+        dates = list(dates)
+        if not dates:
+            return
+        placeholders = ",".join("?" * len(dates))
+        conn.execute(f"DELETE FROM occupancy WHERE date IN ({placeholders})", dates)
+        rows = conn.execute(query + f" WHERE date IN ({placeholders}) ORDER BY date, time, id", dates).fetchall()
+    days, totals, reseated = {}, {}, []
+    counts = config.table_counts
+    for rid, date, hhmm, guests, text in rows:
+        try:
+            seating = () if reseat else parse_seating(text)
+            if not seating or any(seats not in counts for seats, _ in seating):
+                seating = _seat_in_memory(days.setdefault(date, {}), hhmm, guests, config)
+                reseated.append((format_seating(seating), rid))
+            else:
+                _seat_fixed(days.setdefault(date, {}), hhmm, seating, config)
+            _add_usage(totals, date, hhmm, seating, config)
+        except (AttributeError, TypeError, ValueError):
+            continue  # why: rows written before validation existed may be malformed
+    conn.executemany("UPDATE reservations SET seating = ? WHERE id = ?", reseated)
+    conn.executemany(
+        "INSERT INTO occupancy (date, slot, seats, tables) VALUES (?, ?, ?, ?)",
+        ((date, slot, seats, used) for (date, slot, seats), used in totals.items()),
+    )
+
+
+def _seat_fixed(day_usage: dict, hhmm: str, seating, config: CapacityConfig):
+    for slot in covered_slots(hhmm, config):
+        for seats, count in seating:
+            day_usage[(slot, seats)] = day_usage.get((slot, seats), 0) + count
+
+
+def _add_usage(totals: dict, date: str, hhmm: str, seating, config: CapacityConfig, sign: int = 1):
+    """Accumulate one booking's tables into {(date, slot, seats): tables}."""
+    for slot in covered_slots(hhmm, config):
+        for seats, count in seating:
+            key = (date, slot, seats)
+            totals[key] = totals.get(key, 0) + sign * count
+
+
+def apply_booking(conn, date: str, hhmm: str, seating, sign: int = 1, config: CapacityConfig = None):
+    """Add (sign=1) or remove (sign=-1) one booking's tables from the index."""
+    config = config or get_config()
+    totals = {}
+    _add_usage(totals, date, hhmm, seating, config, sign)
+    conn.executemany(_UPSERT_SQL, ((date, slot, seats, used) for (date, slot, seats), used in totals.items()))
+
+
+def seat_bookings(conn, bookings, config: CapacityConfig = None, overbook: bool = True) -> list:
+    """
+    Seat freshly inserted (id, date, hhmm, guests) rows, in order, and add them
+    to occupancy: one read per touched date, one upsert per touched slot and size.
+    A booking with no free seating still gets one, so over-capacity shows up;
+    with overbook=False it is left unseated instead. Returns the unseated ids.
+    """
+    config = config or get_config()
+    dates = sorted({date for _, date, _, _ in bookings})
+    days = {date: {} for date in dates}
+    for start in range(0, len(dates), 500):
+        chunk = dates[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        for date, slot, seats, tables in conn.execute(
+            f"SELECT date, slot, seats, tables FROM occupancy WHERE date IN ({placeholders})", chunk
+        ):
+            days[date][(slot, seats)] = tables
+    totals, seated, unseated = {}, [], []
+    for rid, date, hhmm, guests in bookings:
+        seating = _seat_in_memory(days[date], hhmm, guests, config, overbook)
+        if seating is None:
+            unseated.append(rid)
+            continue
+        seated.append((format_seating(seating), rid))
+        _add_usage(totals, date, hhmm, seating, config)
+    conn.executemany("UPDATE reservations SET seating = ? WHERE id = ?", seated)
+    conn.executemany(_UPSERT_SQL, ((date, slot, seats, used) for (date, slot, seats), used in totals.items()))
+    return unseated
+
+
+def assert_fits(conn, date: str, hhmm: str, config: CapacityConfig = None):
+    """Raise FullyBooked if any slot covered by a booking at date/hhmm has a table size over its count."""
+    config = config or get_config()
+    slots = covered_slots(hhmm, config)
+    over = conn.execute(
+        f"""
+        SELECT slot FROM occupancy
+        WHERE date = ? AND slot BETWEEN ? AND ? AND {over_capacity_sql(config)}
+        LIMIT 1
+        """,
+        (date, slots.start, slots.stop - 1),
+    ).fetchone()
+    if over is not None:
+        raise FullyBooked(f"No table free on {date} at {slot_time(over[0], config)}")
+
+
+# ---------- Availability ----------
+
+def is_available(conn, date: str, hhmm: str, guests: int, ignore: dict = None, config: CapacityConfig = None) -> bool:
+    return choose_seating(conn, date, hhmm, guests, ignore=ignore, config=config) is not None
+
+
+def has_availability(conn, date: str, guests: int, first_slot: int, last_slot: int,
+                     ignore: dict = None, config: CapacityConfig = None) -> bool:
+    """True if some start slot in [first_slot, last_slot] can seat the party."""
+    config = config or get_config()
+    if guests > config.max_party():
+        return False
+    turn = config.slots_per_turn
+    usage = _usage(conn, date, first_slot, last_slot + turn - 1)
+    if not usage:
+        return True
+    own_slots, own = _own_usage(ignore, date, config)
+    return any(
+        _first_fit(usage, range(start, start + turn), guests, config, own_slots, own) is not None
+        for start in range(first_slot, last_slot + 1)
+    )
+
+
+# ---------- Suggestions ----------
+
+def day_occupancy(conn, date: str, config: CapacityConfig = None):
+    """Tables in use for one date: an int32 array of shape (len(config.sizes), slots), row k for sizes[k]."""
+    config = config or get_config()
+    # why: a turn that starts late spills past midnight; keep those slots addressable
+    size = config.slots_per_day + config.slots_per_turn
+    tables = np.zeros((len(config.sizes), size), dtype=np.int32)
+    row_of = {seats: k for k, seats in enumerate(config.sizes)}
+    for slot, seats, used in conn.execute("SELECT slot, seats, tables FROM occupancy WHERE date = ?", (date,)):
+        if seats in row_of and 0 <= slot < size:
+            tables[row_of[seats], slot] = used
+    return tables
+
+
+def _seating_vector(config: CapacityConfig, seating):
+    """A seating as a column of table counts aligned with day_occupancy rows."""
+    need = dict(seating)
+    return np.array([need.get(seats, 0) for seats in config.sizes], dtype=np.int32)[:, None]
+
+
+def feasible_starts(tables, guests: int, ignore: dict = None, date: str = None, config: CapacityConfig = None):
+    """Boolean array over start slots: can the party sit down there, under some seating, for a full turn?"""
+    config = config or get_config()
+    if ignore and ignore.get('date') == date:
+        _, own = _own_usage(ignore, date, config)
+        own_range = covered_slots(ignore['time'], config)
+        tables = tables.copy()  # why: the day array is shared through db.py's cache
+        tables[:, own_range.start:own_range.stop] -= _seating_vector(config, own.items())
+    counts = np.array([config.table_counts[seats] for seats in config.sizes], dtype=np.int32)[:, None]
+    turn = config.slots_per_turn
+    starts = tables.shape[1] - turn + 1
+    feasible = np.zeros(starts, dtype=bool)
+    for seating in config.seatings(guests):
+        need = _seating_vector(config, seating)
+        over = ((tables + need > counts) & (need > 0)).any(axis=0)
+        # window sum of over-capacity slots across each turn; zero means the turn fits
+        cumulative = np.concatenate(([0], np.cumsum(over, dtype=np.int32)))
+        feasible |= (cumulative[turn:turn + starts] - cumulative[:starts]) == 0
+    return feasible
+
+
+def nearest_times(feasible, requested_slot: int, first_slot: int, last_slot: int, k: int = 3,
+                  config: CapacityConfig = None):
+    """Up to k feasible start times within [first_slot, last_slot], nearest to requested_slot first."""
+    config = config or get_config()
+    candidates = np.flatnonzero(feasible[first_slot:last_slot + 1]) + first_slot
+    if candidates.size == 0:
+        return []
+    distance = np.abs(candidates - requested_slot)
+    # stable sort keeps the earlier slot first when two are equally close
+    best = candidates[np.argsort(distance, kind='stable')[:k]]
+    return [slot_time(int(slot), config) for slot in np.sort(best)]
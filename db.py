@@ -0,0 +1,688 @@
+"""
+SQLite access layer for the booking chatbot.
+
+- One process-wide pool of connections per database file; use_database()
+  routes a thread/task to another file (one shard per venue, see venues.py)
+- Connections are opened once with WAL journaling and tuned pragmas
+- Statements go through sqlite3's per-connection statement cache
+- The schema is migrated (see migrations.py) the first time a database is opened
+- Past bookings live in reservations_archive (see archive.py); ID lookups
+  read through to it
+- A guest (by email) has at most one booking per date and time, enforced by a
+  unique index; saves can carry an idempotency key so a retried confirm
+  returns the first save's ID
+- Writes commit directly or, with RESERVATIONS_WRITE_MODE=batched, through a
+  group-commit writer thread (see writebehind.py)
+"""
+
+import contextvars
+import datetime
+import functools
+import hashlib
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import capacity
+import metrics
+import migrations
+import writebehind
+
+DB_PATH = os.environ.get('RESERVATIONS_DB', 'data/reservations.db')
+
+POOL_SIZE = 4
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 128
+LOCK_RETRIES = 3  # extra BEGIN IMMEDIATE attempts once busy_timeout has run out
+
+
+# ---------- Connection Pool ----------
+
+class ConnectionPool:
+    """Small fixed-size pool of SQLite connections to one database file."""
+
+    def __init__(self, path: str, size: int = POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,  # why: connections move between Streamlit script threads
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.row_factory = sqlite3.Row
+        # only takes effect on a new file; archive.py reclaims pages with incremental_vacuum
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._open()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        return self._idle.get()
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._opened = 0
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_database = contextvars.ContextVar('reservations_db', default=None)
+
+
+def get_pool(path: str = None) -> ConnectionPool:
+    """
+    The pool for `path` (default: the use_database() file, else DB_PATH); the
+    schema is migrated when it is first created.
+    """
+    path = path or _database.get() or DB_PATH
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = ConnectionPool(path)
+                conn = pool.acquire()
+                try:
+                    migrations.prepare(conn)
+                finally:
+                    pool.release(conn)
+                _pools[path] = pool
+    return pool
+
+
+def configure(path: str):
+    """Point the default pool at another database file (tests, benchmarks)."""
+    global DB_PATH
+    DB_PATH = path
+
+
+@contextmanager
+def use_database(path: str):
+    """Send every helper in this thread/task to another database file; None means DB_PATH."""
+    token = _database.set(path)
+    try:
+        yield
+    finally:
+        _database.reset(token)
+
+
+def close_all():
+    with _pools_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.stop()  # why: flush queued writes while their pools are still open
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+@contextmanager
+def connection():
+    """Borrow a pooled connection for reads."""
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextmanager
+def transaction():
+    """Borrow a pooled connection inside BEGIN IMMEDIATE; commit (or roll back) on exit."""
+    with connection() as conn:
+        # why: take the write lock up front; a read-then-write upgrade can fail with SQLITE_BUSY
+        begin_immediate(conn)
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def begin_immediate(conn):
+    """BEGIN IMMEDIATE, retried a few times if the write lock stays busy past busy_timeout."""
+    for attempt in range(LOCK_RETRIES + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if attempt == LOCK_RETRIES or ('locked' not in str(e) and 'busy' not in str(e)):
+                raise
+            metrics.count('db_lock_retries_total')
+
+
+# ---------- Schema ----------
+
+def ensure_db():
+    """Open the database, applying any pending migrations (once per process)."""
+    get_pool()
+
+
+def read_write_version(conn) -> int:
+    row = conn.execute("SELECT value FROM meta WHERE key = 'write_version'").fetchone()
+    return row[0] if row else 0
+
+
+@metrics.timed('db_op_seconds', op='get_write_version')
+def get_write_version() -> int:
+    """Counter bumped by every write to reservations; use it as a cache key."""
+    with connection() as conn:
+        return read_write_version(conn)
+
+
+# ---------- Reservations ----------
+
+ARCHIVE_COLUMNS = "id, name, guests, date, time, email, phone, special_requests"
+
+
+@metrics.timed('db_op_seconds', op='get_reservation')
+def get_reservation(reservation_id, include_archived: bool = True):
+    """
+    Primary-key lookup; returns a dict or None.
+
+    Archived (past) bookings are found too, flagged with 'archived': True.
+    """
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM reservations WHERE id=?", (reservation_id,)).fetchone()
+        found = dict(row) if row else None
+        if found is None and include_archived:
+            found = _archived(conn, (reservation_id,)).get(reservation_id)
+    if found is not None:
+        metrics.count('db_rows_read_total')
+    return found
+
+
+def _archived(conn, ids) -> dict:
+    placeholders = ",".join("?" * len(ids))
+    return {
+        row['id']: {**dict(row), 'archived': True}
+        for row in conn.execute(
+            f"SELECT {ARCHIVE_COLUMNS} FROM reservations_archive WHERE id IN ({placeholders})", ids
+        )
+    }
+
+
+@metrics.timed('db_op_seconds', op='get_reservations')
+def get_reservations(reservation_ids, include_archived: bool = True):
+    """Batch primary-key lookup; returns {id: dict} for the IDs that exist (live or archived)."""
+    ids = list(dict.fromkeys(reservation_ids))
+    found = {}
+    with connection() as conn:
+        # why: stay well under SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for row in conn.execute(f"SELECT * FROM reservations WHERE id IN ({placeholders})", chunk):
+                found[row['id']] = dict(row)
+            missing = [i for i in chunk if i not in found]
+            if missing and include_archived:
+                found.update(_archived(conn, missing))
+    metrics.count('db_rows_read_total', len(found))
+    return found
+
+
+@metrics.timed('db_op_seconds', op='get_reservations_page')
+def get_reservations_page(after=None, limit=25, date_from=None, date_to=None, name=None):
+    """
+    One page of reservations ordered by (date, time, id).
+
+    `after` is the (date, time, id) key of the last row on the previous page
+    (keyset pagination), so every page costs an index range scan.
+    """
+    clauses, params = [], []
+    if after is not None:
+        clauses.append("(date, time, id) > (?, ?, ?)")
+        params.extend(after)
+    if date_from:
+        clauses.append("date >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("date <= ?")
+        params.append(date_to)
+    if name:
+        clauses.append("name LIKE ? ESCAPE '\\'")
+        escaped = name.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        params.append(f"%{escaped}%")
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with connection() as conn:
+        rows = conn.execute(
+            f"SELECT * FROM reservations {where} ORDER BY date, time, id LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+    metrics.count('db_rows_read_total', len(rows))
+    return [dict(row) for row in rows]
+
+
+SEARCH_WEIGHTS = (10.0, 5.0, 5.0, 1.0)  # bm25 weights: name, email, phone, special_requests
+_PHONE_PUNCTUATION_RE = re.compile(r"[\s()+-]")
+_has_fts = {}
+
+
+def _like_pattern(text: str) -> str:
+    return "%" + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + "%"
+
+
+_CONTAINS_SQL = "(r.name LIKE ? ESCAPE '\\' OR r.email LIKE ? ESCAPE '\\' OR r.phone LIKE ? ESCAPE '\\')"
+
+
+def _fts_query(text: str):
+    """
+    (FTS5 MATCH expression, short terms): every term of 3+ characters (the
+    trigram minimum) goes to the index; shorter ones are matched with LIKE.
+    """
+    terms, short = [], []
+    for term in text.split():
+        digits = _PHONE_PUNCTUATION_RE.sub("", term)
+        if digits.isdigit():
+            term = digits  # why: the index stores phone numbers as bare digits
+        term = term.replace('"', '')
+        if len(term) >= 3:
+            terms.append(f'"{term}"')
+        elif term:
+            short.append(term)
+    return " AND ".join(terms), short
+
+
+@metrics.timed('db_op_seconds', op='search_reservations')
+def search_reservations(text: str, limit: int = 10, date_from=None, date_to=None):
+    """
+    Reservations whose name, email, phone or special requests contain the
+    words in `text`, best match first (FTS5 trigram index, bm25 ranking).
+    """
+    text = (text or "").strip()
+    if not text:
+        return []
+    clauses, params = [], []
+    if date_from:
+        clauses.append("r.date >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("r.date <= ?")
+        params.append(date_to)
+    match, short = _fts_query(text)
+    path = get_pool().path
+    with connection() as conn:
+        if path not in _has_fts:
+            _has_fts[path] = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'reservations_fts'"
+            ).fetchone() is not None
+        if match and _has_fts[path]:
+            for term in short:
+                clauses.append(_CONTAINS_SQL)
+                params.extend([_like_pattern(term)] * 3)
+            where = "".join(f" AND {c}" for c in clauses)
+            weights = ", ".join(str(w) for w in SEARCH_WEIGHTS)
+            rows = conn.execute(
+                f"""
+                SELECT r.* FROM reservations_fts JOIN reservations r ON r.id = reservations_fts.rowid
+                WHERE reservations_fts MATCH ?{where}
+                ORDER BY bm25(reservations_fts, {weights}), r.date, r.time
+                LIMIT ?
+                """,
+                (match, *params, limit),
+            ).fetchall()
+        else:
+            # short queries (under 3 characters) or no FTS5: plain scan of the live table
+            for term in text.split():
+                clauses.append(_CONTAINS_SQL)
+                params.extend([_like_pattern(term)] * 3)
+            rows = conn.execute(
+                f"SELECT r.* FROM reservations r WHERE {' AND '.join(clauses)} ORDER BY r.date, r.time LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+    metrics.count('db_rows_read_total', len(rows))
+    return [dict(row) for row in rows]
+
+
+@metrics.timed('db_op_seconds', op='daily_totals')
+def daily_totals(date_from: str, date_to: str):
+    """[(date, bookings, covers)] per day in [date_from, date_to], archived bookings included."""
+    with connection() as conn:
+        return [tuple(row) for row in conn.execute(
+            """
+            SELECT date, count(*), coalesce(sum(guests), 0) FROM (
+                SELECT date, guests FROM reservations WHERE date BETWEEN ?1 AND ?2
+                UNION ALL
+                SELECT date, guests FROM reservations_archive WHERE date BETWEEN ?1 AND ?2
+            )
+            GROUP BY date ORDER BY date
+            """,
+            (date_from, date_to),
+        )]
+
+
+# ---------- Writes ----------
+# The *_op functions run on a connection that is already inside a write
+# transaction, so the same code serves direct commits and group commits.
+
+WRITE_MODE = os.environ.get('RESERVATIONS_WRITE_MODE', 'direct')  # 'direct' or 'batched'
+BATCH_WINDOW_MS = float(os.environ.get('RESERVATIONS_BATCH_MS', 5))
+
+
+class DuplicateBooking(Exception):
+    """The guest already has a booking at that date and time."""
+
+    def __init__(self, reservation_id: int):
+        super().__init__(f"Already booked as reservation {reservation_id}")
+        self.reservation_id = reservation_id
+
+
+# matches idx_reservations_booking_key (migrations.BOOKING_KEY_SQL)
+_BOOKING_KEY_SQL = (
+    "SELECT id FROM reservations "
+    "WHERE lower(trim(email)) = lower(trim(?)) AND date = ? AND time = ? AND id IS NOT ?"
+)
+
+
+class IdempotencyKeyReused(Exception):
+    """An idempotency key came back with a different booking than the one it was first used for."""
+
+
+_REQUEST_FIELDS = ('name', 'guests', 'date', 'time', 'email', 'phone', 'special_requests')
+
+
+def _request_hash(r: dict) -> str:
+    fields = {k: r.get(k) or '' for k in _REQUEST_FIELDS}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+def _assert_unique(conn, r: dict, own_id: int = None):
+    # why: the unique index would reject it anyway; checking first names the booking it collides with
+    row = conn.execute(_BOOKING_KEY_SQL, (r['email'], r['date'], r['time'], own_id)).fetchone()
+    if row is not None:
+        raise DuplicateBooking(row[0])
+
+
+def insert_op(conn, reservation_data, idempotency_key: str = None) -> int:
+    if idempotency_key is not None:
+        request_hash = _request_hash(reservation_data)
+        seen = conn.execute(
+            "SELECT reservation_id, request_hash FROM idempotency_keys WHERE key = ?", (idempotency_key,)
+        ).fetchone()
+        if seen is not None:
+            if seen['request_hash'] != request_hash:
+                raise IdempotencyKeyReused(f"Idempotency key {idempotency_key!r} was used for another booking")
+            return seen['reservation_id']  # a retry of a save that already committed
+    _assert_unique(conn, reservation_data)
+    seating = capacity.choose_seating(
+        conn, reservation_data['date'], reservation_data['time'], reservation_data['guests']
+    )
+    if seating is None:
+        raise capacity.FullyBooked(f"No table free on {reservation_data['date']} at {reservation_data['time']}")
+    row = conn.execute(
+        """
+        INSERT INTO reservations (name, guests, date, time, email, phone, special_requests, seating)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        RETURNING id
+        """,
+        (
+            reservation_data['name'],
+            reservation_data['guests'],
+            reservation_data['date'],
+            reservation_data['time'],
+            reservation_data['email'],
+            reservation_data['phone'],
+            reservation_data.get('special_requests', ''),
+            capacity.format_seating(seating),
+        )
+    ).fetchone()
+    capacity.apply_booking(conn, reservation_data['date'], reservation_data['time'], seating)
+    # why: checked after the insert so the write lock is held and concurrent confirms serialize
+    capacity.assert_fits(conn, reservation_data['date'], reservation_data['time'])
+    if idempotency_key is not None:
+        conn.execute(
+            "INSERT INTO idempotency_keys (key, reservation_id, request_hash, created_at) "
+            "VALUES (?, ?, ?, datetime('now'))",
+            (idempotency_key, row[0], request_hash),
+        )
+    return row[0]
+
+
+def update_op(conn, reservation) -> bool:
+    old = conn.execute(
+        "SELECT date, time, guests, seating FROM reservations WHERE id=?", (reservation['id'],)
+    ).fetchone()
+    if old is None:
+        return False
+    _assert_unique(conn, reservation, own_id=reservation['id'])
+    old_seating = capacity.recorded_seating(old['seating'], old['guests'])
+    capacity.apply_booking(conn, old['date'], old['time'], old_seating, sign=-1)
+    # why: re-seat from scratch, since a smaller party may now fit a smaller table
+    seating = capacity.choose_seating(conn, reservation['date'], reservation['time'], reservation['guests'])
+    moved = (old['date'], old['time']) != (reservation['date'], reservation['time'])
+    grew = moved or reservation['guests'] > old['guests']
+    if seating is None:
+        if grew:
+            raise capacity.FullyBooked(f"No table free on {reservation['date']} at {reservation['time']}")
+        seating = old_seating  # why: an edit that asks for no more room never loses the table it has
+    conn.execute(
+        "UPDATE reservations SET name=?, guests=?, date=?, time=?, email=?, phone=?, special_requests=?, seating=? "
+        "WHERE id=?",
+        (
+            reservation['name'],
+            reservation['guests'],
+            reservation['date'],
+            reservation['time'],
+            reservation['email'],
+            reservation['phone'],
+            reservation.get('special_requests', ''),
+            capacity.format_seating(seating),
+            reservation['id'],
+        ),
+    )
+    capacity.apply_booking(conn, reservation['date'], reservation['time'], seating)
+    if grew:
+        capacity.assert_fits(conn, reservation['date'], reservation['time'])
+    return True
+
+
+def delete_op(conn, reservation_id) -> bool:
+    old = conn.execute(
+        "DELETE FROM reservations WHERE id=? RETURNING date, time, guests, seating", (reservation_id,)
+    ).fetchone()
+    if old is not None:
+        seating = capacity.recorded_seating(old['seating'], old['guests'])
+        capacity.apply_booking(conn, old['date'], old['time'], seating, sign=-1)
+    return old is not None
+
+
+_writers = {}
+
+
+def configure_writes(mode: str = None, window_ms: float = None):
+    """Switch between 'direct' commits and 'batched' group commits; flushes running writers."""
+    global WRITE_MODE, BATCH_WINDOW_MS
+    if mode is not None and mode not in ('direct', 'batched'):
+        raise ValueError(f"Unknown write mode: {mode}")
+    if (mode or WRITE_MODE, window_ms or BATCH_WINDOW_MS) == (WRITE_MODE, BATCH_WINDOW_MS):
+        return
+    WRITE_MODE = mode or WRITE_MODE
+    BATCH_WINDOW_MS = window_ms or BATCH_WINDOW_MS
+    with _pools_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.stop()
+
+
+def _writer_for(pool):
+    writer = _writers.get(pool.path)
+    if writer is None:
+        with _pools_lock:
+            writer = _writers.get(pool.path)
+            if writer is None:
+                writer = _writers[pool.path] = writebehind.start_writer(
+                    pool, window_ms=BATCH_WINDOW_MS, begin=begin_immediate
+                )
+    return writer
+
+
+def _submit(op, arg) -> Future:
+    if WRITE_MODE == 'batched':
+        # why: the op runs on the writer thread; carry this context's capacity config along
+        context = contextvars.copy_context()
+        return _writer_for(get_pool()).submit(lambda conn: context.run(op, conn, arg))
+    future = Future()
+    try:
+        with transaction() as conn:
+            result = op(conn, arg)
+    except Exception as e:
+        future.set_exception(e)
+    else:
+        future.set_result(result)
+    return future
+
+
+def submit_save(reservation_data, idempotency_key: str = None) -> Future:
+    """Queue an insert; the future resolves with the new ID once committed."""
+    return _submit(functools.partial(insert_op, idempotency_key=idempotency_key), reservation_data)
+
+
+def submit_update(reservation) -> Future:
+    """The future resolves with True if the reservation was found and updated."""
+    return _submit(update_op, reservation)
+
+
+def submit_delete(reservation_id) -> Future:
+    """The future resolves with True if a reservation was deleted."""
+    return _submit(delete_op, reservation_id)
+
+
+@metrics.timed('db_op_seconds', op='save_reservation')
+def save_reservation(reservation_data, idempotency_key: str = None):
+    """
+    Insert a reservation and return its new ID (allocated by SQLite in the same statement).
+
+    Raises capacity.FullyBooked (and writes nothing) if the slot has no room, and
+    DuplicateBooking if the guest already holds that slot. A save repeated with
+    the same `idempotency_key` returns the first save's ID and writes nothing;
+    IdempotencyKeyReused if the key was first used for a different booking.
+    """
+    return submit_save(reservation_data, idempotency_key).result()
+
+
+@metrics.timed('db_op_seconds', op='update_reservation')
+def update_reservation(reservation) -> bool:
+    """
+    True if the reservation was found and updated, False if it no longer exists.
+
+    Raises capacity.FullyBooked (and writes nothing) if a move or bigger party
+    doesn't fit, and DuplicateBooking if it lands on another of the guest's bookings.
+    """
+    return submit_update(reservation).result()
+
+
+@metrics.timed('db_op_seconds', op='delete_reservation')
+def delete_reservation(reservation_id):
+    return submit_delete(reservation_id).result()
+
+
+# ---------- Availability ----------
+
+@metrics.timed('db_op_seconds', op='is_available')
+def is_available(date: str, hhmm: str, guests: int, ignore: dict = None) -> bool:
+    """Whether a party fits at date/time; `ignore` is a booking being edited."""
+    with connection() as conn:
+        return capacity.is_available(conn, date, hhmm, guests, ignore=ignore)
+
+
+@metrics.timed('db_op_seconds', op='has_availability')
+def has_availability(date: str, guests: int, opening: str, closing: str, ignore: dict = None) -> bool:
+    """Whether a party fits anywhere between opening and closing (HH:MM) on date."""
+    with connection() as conn:
+        return capacity.has_availability(
+            conn, date, guests, capacity.slot_of(opening), capacity.slot_of(closing), ignore=ignore
+        )
+
+
+# ---------- Suggestions ----------
+
+DAY_CACHE_SIZE = 256
+_day_cache = {}
+
+
+def _day_occupancy(conn, date: str):
+    """Per-day occupancy array, reused until the next reservation write."""
+    key = (get_pool().path, date)
+    version = read_write_version(conn)
+    hit = _day_cache.get(key)
+    if hit is not None and hit[0] == version:
+        return hit[1]
+    arrays = capacity.day_occupancy(conn, date)
+    if len(_day_cache) >= DAY_CACHE_SIZE:
+        _day_cache.pop(next(iter(_day_cache)), None)
+    _day_cache[key] = (version, arrays)
+    return arrays
+
+
+@metrics.timed('db_op_seconds', op='suggest_times')
+def suggest_times(date: str, hhmm: str, guests: int, opening: str, closing: str, k: int = 3, ignore: dict = None):
+    """Up to k free start times on `date` nearest to hhmm, within opening hours."""
+    with connection() as conn:
+        tables = _day_occupancy(conn, date)
+    feasible = capacity.feasible_starts(tables, guests, ignore=ignore, date=date)
+    return capacity.nearest_times(
+        feasible, capacity.slot_of(hhmm), capacity.slot_of(opening), capacity.slot_of(closing), k=k
+    )
+
+
+@metrics.timed('db_op_seconds', op='suggest_dates')
+def suggest_dates(date: str, hhmm: str, guests: int, k: int = 3, span: int = 3, ignore: dict = None):
+    """Up to k dates within `span` days of `date` (nearest first, none in the past) where hhmm is free."""
+    day = datetime.date.fromisoformat(date)
+    today = datetime.date.today()
+    slot = capacity.slot_of(hhmm)
+    found = []
+    with connection() as conn:
+        for offset in sorted(range(-span, span + 1), key=lambda n: (abs(n), n)):
+            candidate = day + datetime.timedelta(days=offset)
+            if offset == 0 or candidate < today:
+                continue
+            iso = candidate.isoformat()
+            tables = _day_occupancy(conn, iso)
+            if capacity.feasible_starts(tables, guests, ignore=ignore, date=iso)[slot]:
+                found.append(iso)
+                if len(found) == k:
+                    break
+    return found
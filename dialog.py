@@ -0,0 +1,572 @@
+"""
+Headless booking conversation engine.
+
+- BookingDialog is a table-driven state machine with no Streamlit dependency
+- Per-conversation state lives in a compact DialogState (__slots__)
+- Front ends call BookingDialog.handle(state, text) and render state.messages
+  (a bounded history.MessageLog)
+"""
+
+import datetime
+import re
+import secrets
+from datetime import time
+
+import db
+import metrics
+from capacity import FullyBooked, get_config
+from extract import NUMBER_WORDS, detect_intent, extract_slots
+from history import MessageLog
+from validation import CLOSING_TIME, OPENING_TIME, is_valid_email, is_valid_phone, is_within_hours
+
+_DIGITS_RE = re.compile(r"\d+")
+_NUMBER_WORD_RE = re.compile(r"\b(?:" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r")\b", re.I)
+_RESERVATION_ID_RE = re.compile(r"^(?:id\s*)?#?\s*(\d{1,9})$", re.I)
+YES_WORDS = frozenset(('yes', 'y', 'yeah', 'yep'))
+NO_WORDS = frozenset(('no', 'n', 'nope'))
+
+SEARCH_RESULTS = 5  # bookings listed when a name/contact search matches several
+
+# Booking steps in order: (step, reservation field)
+BOOKING_STEPS = (
+    ('guests', 'guests'),
+    ('date', 'date'),
+    ('time', 'time'),
+    ('name', 'name'),
+    ('email', 'email'),
+    ('phone', 'phone'),
+    ('special', 'special_requests'),
+)
+STEP_FIELDS = dict(BOOKING_STEPS)
+
+STEP_PROMPTS = {
+    'guests': "How many people?",
+    'date': "Select the **date** for your reservation.",
+    'time': "Now choose a **time** (e.g., 19:30).",
+    'name': "What's your **name**?",
+    'email': "Your **email**?",
+    'phone': "Your **phone number**?",
+    'special': "Any **special requests**? If none, say 'no'.",
+}
+
+# Words accepted at the correction step -> booking step to re-ask
+CORRECTION_STEPS = {
+    'guests': 'guests',
+    'people': 'guests',
+    'party': 'guests',
+    'date': 'date',
+    'day': 'date',
+    'time': 'time',
+    'hour': 'time',
+    'name': 'name',
+    'email': 'email',
+    'phone': 'phone',
+    'number': 'phone',
+    'special': 'special',
+    'requests': 'special',
+}
+
+FIELD_LIST = "guests, date, time, name, email, phone, special"
+
+# Steps where a free-text answer may carry other fields too ("4 tomorrow at 7pm")
+EXTRACT_STEPS = frozenset(('guests', 'date', 'time', 'email', 'phone'))
+
+
+class InvalidInput(ValueError):
+    """Raised by a step parser; the message is sent back to the user."""
+
+
+class SlotUnavailable(InvalidInput):
+    """A well-formed time we can't seat; the reply offers alternatives."""
+
+    def __init__(self, message: str, requested: str):
+        super().__init__(message)
+        self.requested = requested
+
+
+class DialogState:
+    """Everything one conversation needs between turns."""
+
+    __slots__ = (
+        'messages', 'reservation_data', 'current_step', 'editing_id', 'correcting', 'confirm_token', 'match_id'
+    )
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.messages = MessageLog()
+        self.reservation_data = {}
+        self.current_step = 'greeting'
+        self.editing_id = None
+        self.correcting = False
+        self.confirm_token = None  # idempotency key for the summary on screen
+        self.match_id = None  # a search hit waiting for the guest to say it is theirs
+
+    def add_message(self, role: str, content: str):
+        self.messages.append(role, content)
+
+    def to_dict(self) -> dict:
+        """Plain-data snapshot (for session_store); safe to serialize on another thread."""
+        return {
+            'messages': [list(m) for m in self.messages],
+            'dropped': self.messages.dropped,
+            'reservation_data': dict(self.reservation_data),
+            'current_step': self.current_step,
+            'editing_id': self.editing_id,
+            'correcting': self.correcting,
+            'confirm_token': self.confirm_token,
+            'match_id': self.match_id,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        state = cls()
+        for role, content in data.get('messages', ()):
+            state.messages.append(role, content)
+        state.messages.dropped += data.get('dropped', 0)
+        state.reservation_data = dict(data.get('reservation_data', {}))
+        state.current_step = data.get('current_step', 'greeting')
+        state.editing_id = data.get('editing_id')
+        state.correcting = data.get('correcting', False)
+        state.confirm_token = data.get('confirm_token')
+        state.match_id = data.get('match_id')
+        return state
+
+
+def format_summary(r: dict) -> str:
+    return (
+        f"Please confirm:\n\n"
+        f"• Name: {r['name']}\n"
+        f"• Guests: {r['guests']}\n"
+        f"• Date: {r['date']}\n"
+        f"• Time: {r['time']}\n"
+        f"• Email: {r['email']}\n"
+        f"• Phone: {r['phone']}\n"
+        f"• Special: {r.get('special_requests','')}\n\n"
+        "Type **confirm** to save or **edit** to make changes."
+    )
+
+
+def format_match(r: dict) -> str:
+    """One search hit, without contact details: it may not be the asker's booking."""
+    return f"• **{r['id']}**: {r['name']}, {r['guests']} guests, {r['date']} {r['time']}"
+
+
+def parse_reservation_id(text: str):
+    """The ID in "12", "#12", "my id is 12" or "reservation 12 please"; None for names, emails and phones."""
+    match = _RESERVATION_ID_RE.match(text)
+    if match:
+        return int(match.group(1))
+    runs = _DIGITS_RE.findall(text)
+    # why: one short run of digits is an ID however it's worded; a phone has more digits or several groups
+    if '@' not in text and len(runs) == 1 and len(runs[0]) <= 9:
+        return int(runs[0])
+    return None
+
+
+def format_reservation(r: dict) -> str:
+    return (
+        f"Reservation **{r['id']}**: {r['name']}, {r['guests']} guests, {r['date']} {r['time']}, "
+        f"{r['email']}, {r['phone']}, Special: {r.get('special_requests','')}"
+    )
+
+
+class BookingDialog:
+    """
+    Stateless dispatcher over DialogState.
+
+    `store` is anything exposing the db.py reservation helpers, so the
+    dialog can run against another database or a fake in tests.
+    """
+
+    def __init__(self, store=db, opening: time = OPENING_TIME, closing: time = CLOSING_TIME):
+        self.store = store
+        self.opening = opening
+        self.closing = closing
+        self.parsers = {
+            'guests': self.parse_guests,
+            'date': self.parse_date,
+            'time': self.parse_time,
+            'name': self.parse_name,
+            'email': self.parse_email,
+            'phone': self.parse_phone,
+            'special': self.parse_special,
+        }
+        self.handlers = {
+            'greeting': self.on_greeting,
+            'await_intent': self.on_intent,
+            'post_confirmation': self.on_intent,
+            'confirm': self.on_confirm,
+            'correction': self.on_correction,
+            'manage_id': self.on_manage_id,
+            'manage_match': self.on_manage_match,
+            'manage_action': self.on_manage_action,
+        }
+        for step in self.parsers:
+            self.handlers[step] = self.on_field
+
+    def handle(self, state: DialogState, user_input: str):
+        user_input = user_input.strip()
+        if not user_input:
+            return
+        state.add_message("user", user_input)
+        handler = self.handlers.get(state.current_step)
+        if handler is not None:
+            with metrics.span('dialog_step_seconds', step=state.current_step):
+                handler(state, user_input)
+
+    # ---------- Field parsers ----------
+
+    def parse_guests(self, text: str):
+        match = _DIGITS_RE.search(text)
+        if match:
+            guests = int(match.group())
+        else:
+            words = _NUMBER_WORD_RE.findall(text)  # "four", "a couple"
+            if len(words) > 1:
+                # why: "twenty five" would read as 20; ask for digits rather than guess
+                raise InvalidInput("Please give the number of guests in digits (e.g., 2, 4, 6).")
+            if not words:
+                raise InvalidInput("Please provide a valid number of guests (e.g., 2, 4, 6).")
+            guests = NUMBER_WORDS[words[0].lower()]
+        return max(1, min(20, guests))
+
+    def parse_date(self, text: str):
+        # Handled via date picker; we still accept textual YYYY-MM-DD.
+        try:
+            datetime.date.fromisoformat(text[:10])
+        except ValueError:
+            raise InvalidInput("Use the date picker or type as YYYY-MM-DD.")
+        return text[:10]
+
+    def parse_time(self, text: str):
+        try:
+            hh, mm = [int(x) for x in text.split(":")]
+            t = time(hh, mm)
+        except ValueError:
+            raise InvalidInput("Please type time like HH:MM (e.g., 18:45).")
+        if not is_within_hours(t, self.opening, self.closing):
+            raise SlotUnavailable(
+                f"We are open {self.opening:%H:%M}–{self.closing:%H:%M}. Pick a time within hours.",
+                f"{hh:02d}:{mm:02d}",
+            )
+        return f"{hh:02d}:{mm:02d}"
+
+    def parse_name(self, text: str):
+        return text.title()
+
+    def parse_email(self, text: str):
+        if not is_valid_email(text):
+            raise InvalidInput("That email looks invalid. Try again.")
+        return text
+
+    def parse_phone(self, text: str):
+        if not is_valid_phone(text):
+            raise InvalidInput("Please provide a valid phone number.")
+        return text
+
+    def parse_special(self, text: str):
+        return "" if text.lower() in ("no", "none", "n/a") else text
+
+    # ---------- Step handlers ----------
+
+    def on_greeting(self, state: DialogState, text: str):
+        state.add_message(
+            "assistant",
+            "Hello! I'm your booking assistant. Would you like to **book a table** or **manage reservations**?",
+        )
+        state.current_step = 'await_intent'
+
+    def on_intent(self, state: DialogState, text: str):
+        slots = extract_slots(text)
+        intent = detect_intent(text)
+        if intent == 'book' or (intent is None and slots):
+            state.reservation_data = {}
+            state.editing_id = None
+            state.correcting = False
+            filled = self.fill(state, slots)
+            if not filled:
+                state.add_message("assistant", "Great! How many people?")
+                state.current_step = 'guests'
+                return
+            self.advance(state, prefix=f"Great! Got it: {filled}.\n\n")
+        elif intent == 'manage':
+            state.add_message(
+                "assistant", "Please enter your reservation ID, or the name, email or phone it was booked under."
+            )
+            state.current_step = 'manage_id'
+        else:
+            state.add_message("assistant", "Please say **book** or **manage**.")
+
+    def on_field(self, state: DialogState, text: str):
+        step = state.current_step
+        field = STEP_FIELDS[step]
+        slots = extract_slots(text) if step in EXTRACT_STEPS else {}
+        if state.correcting:
+            # why: a correction changes exactly one field
+            slots = {field: slots[field]} if field in slots else {}
+        if slots and field not in slots:
+            # why: "tomorrow at 7pm" at the guests step answers other questions, not this one
+            filled = self.fill(state, slots)
+            if filled:
+                self.advance(state, prefix=f"Got it: {filled}.\n\n")
+                return
+        answer = slots.pop(field, text)
+        try:
+            value = self.parsers[step](answer)
+        except SlotUnavailable as e:
+            state.add_message("assistant", str(e) + self.suggest(state, e.requested))
+            return
+        except InvalidInput as e:
+            state.add_message("assistant", str(e))
+            return
+        try:
+            self.check_capacity(state, field, value)
+        except SlotUnavailable as e:
+            state.add_message("assistant", str(e) + self.suggest(state, e.requested))
+            return
+        except InvalidInput as e:
+            state.add_message("assistant", str(e))
+            return
+        state.reservation_data[field] = value
+        self.fill(state, slots)
+        self.advance(state)
+
+    def fill(self, state: DialogState, slots: dict) -> str:
+        """
+        Store extracted values for fields not answered yet, through the same
+        parsers and capacity checks as typed answers; invalid ones are dropped
+        and asked for normally. Returns a short description of what was kept.
+        """
+        kept = []
+        for step, field in BOOKING_STEPS:
+            if field not in slots or field in state.reservation_data:
+                continue
+            try:
+                value = self.parsers[step](slots[field])
+                self.check_capacity(state, field, value)
+            except InvalidInput:
+                continue
+            state.reservation_data[field] = value
+            kept.append(f"{value} guests" if field == 'guests' else str(value))
+        return ", ".join(kept)
+
+    def check_capacity(self, state: DialogState, field: str, value):
+        """Reject a guests/date/time answer that leaves the party without a table."""
+        if field not in ('guests', 'date', 'time'):
+            return
+        r = {**state.reservation_data, field: value}
+        guests = r.get('guests')
+        if guests is None:
+            return
+        max_party = get_config().max_party()
+        if guests > max_party:
+            raise InvalidInput(
+                f"We can take bookings for up to {max_party} guests here. For larger parties, please call us."
+            )
+        if 'date' not in r:
+            return
+        ignore = self.store.get_reservation(state.editing_id) if state.editing_id is not None else None
+        if 'time' in r:
+            if not self.store.is_available(r['date'], r['time'], guests, ignore=ignore):
+                if field == 'time':
+                    raise SlotUnavailable(f"Sorry, we're fully booked at {r['time']} on {r['date']}.", r['time'])
+                retry = "Please choose a smaller party." if field == 'guests' else "Please pick another date."
+                raise InvalidInput(f"Sorry, we're fully booked at {r['time']} on {r['date']}. {retry}")
+        elif not self.store.has_availability(
+            r['date'], guests, f"{self.opening:%H:%M}", f"{self.closing:%H:%M}", ignore=ignore
+        ):
+            raise InvalidInput(f"Sorry, we're fully booked on {r['date']} for {guests}. Please pick another date.")
+
+    def advance(self, state: DialogState, prefix: str = ""):
+        """Move to the next unfilled booking step, or to confirmation."""
+        if state.correcting:
+            state.correcting = False
+            state.add_message("assistant", prefix + "Continue: type **confirm** to save or edit another field.")
+            state.confirm_token = secrets.token_urlsafe(12)
+            state.current_step = 'confirm'
+            return
+        for step, field in BOOKING_STEPS:
+            if field not in state.reservation_data:
+                state.add_message("assistant", prefix + STEP_PROMPTS[step])
+                state.current_step = step
+                return
+        state.add_message("assistant", prefix + format_summary(state.reservation_data))
+        # why: a confirm retried after a crash or resume must not book twice
+        state.confirm_token = secrets.token_urlsafe(12)
+        state.current_step = 'confirm'
+
+    def suggest(self, state: DialogState, requested: str) -> str:
+        """Nearest free times that day, and the same time on nearby days, as a reply suffix."""
+        r = state.reservation_data
+        if 'date' not in r or 'guests' not in r:
+            return ""
+        ignore = self.store.get_reservation(state.editing_id) if state.editing_id is not None else None
+        times = self.store.suggest_times(
+            r['date'], requested, r['guests'], f"{self.opening:%H:%M}", f"{self.closing:%H:%M}", ignore=ignore
+        )
+        lines = []
+        if times:
+            lines.append(f"Nearest free times on {r['date']}: " + ", ".join(f"**{t}**" for t in times))
+        if is_within_hours(time.fromisoformat(requested), self.opening, self.closing):
+            dates = self.store.suggest_dates(r['date'], requested, r['guests'], ignore=ignore)
+            if dates:
+                lines.append(f"{requested} is free on: " + ", ".join(f"**{d}**" for d in dates))
+        if not lines:
+            return ""
+        return "\n\n" + "\n\n".join(lines)
+
+    def on_confirm(self, state: DialogState, text: str):
+        answer = text.lower()
+        if answer == 'confirm':
+            try:
+                if state.editing_id is not None:
+                    if self.store.update_reservation({**state.reservation_data, 'id': state.editing_id}):
+                        message = f"✅ Reservation **{state.editing_id}** updated. Need anything else?"
+                    else:
+                        # why: cancelled (or archived) elsewhere since this edit started
+                        message = (
+                            f"Reservation **{state.editing_id}** was not found anymore, so nothing was changed. "
+                            "Need anything else?"
+                        )
+                        state.editing_id = None
+                else:
+                    new_id = self.store.save_reservation(state.reservation_data, idempotency_key=state.confirm_token)
+                    state.reservation_data['id'] = new_id
+                    message = f"✅ Reservation saved! Your ID is **{new_id}**. Need anything else?"
+            except db.DuplicateBooking as e:
+                r = state.reservation_data
+                if state.editing_id is not None:
+                    r.pop('time', None)
+                    state.correcting = True
+                    state.add_message(
+                        "assistant",
+                        f"You already have reservation **{e.reservation_id}** at that time. "
+                        "Please pick another **time**.",
+                    )
+                    state.current_step = 'time'
+                    return
+                r['id'] = e.reservation_id
+                message = (
+                    f"You already have reservation **{e.reservation_id}** on {r['date']} at {r['time']}, "
+                    "so nothing new was booked. Need anything else?"
+                )
+            except FullyBooked:
+                # why: the slot filled up between the time step and confirm
+                state.reservation_data.pop('time', None)
+                state.correcting = True
+                state.add_message("assistant", "Sorry, that time was just taken. Please pick another **time**.")
+                state.current_step = 'time'
+                return
+            state.add_message("assistant", message)
+            state.current_step = 'post_confirmation'
+        elif answer == 'edit':
+            state.add_message("assistant", f"What would you like to change? ({FIELD_LIST})")
+            state.current_step = 'correction'
+        else:
+            state.add_message("assistant", "Please type **confirm** or **edit**.")
+
+    def on_correction(self, state: DialogState, text: str):
+        step = CORRECTION_STEPS.get(text.lower())
+        if not step:
+            state.add_message("assistant", f"Specify one of: {FIELD_LIST}.")
+            return
+        field = STEP_FIELDS[step]
+        state.reservation_data.pop(field, None)
+        state.correcting = True
+        state.add_message("assistant", f"Okay, please provide new value for **{field}**.")
+        state.current_step = step
+
+    # ---------- Manage reservation path ----------
+
+    def on_manage_id(self, state: DialogState, text: str):
+        rid = parse_reservation_id(text)
+        if rid is not None:
+            r = self.store.get_reservation(rid)
+            if r is None:
+                state.add_message("assistant", f"I couldn't find reservation ID {rid}. Try again.")
+                return
+            self.open_booking(state, r)
+            return
+        # why: staff often have a name or phone number rather than the ID
+        found = self.store.search_reservations(text, limit=SEARCH_RESULTS)
+        if not found:
+            state.add_message(
+                "assistant", "I couldn't find a booking matching that. Try the reservation ID, name, email or phone."
+            )
+            return
+        if len(found) > 1:
+            listing = "\n".join(format_match(m) for m in found)
+            state.add_message("assistant", f"I found several bookings:\n{listing}\n\nPlease enter the reservation ID.")
+            return
+        # why: a partial name or phone match may be someone else's booking; only an ID opens one directly
+        state.match_id = found[0]['id']
+        state.add_message(
+            "assistant", f"I found this booking:\n{format_match(found[0])}\n\nIs it yours? Type **yes** or **no**."
+        )
+        state.current_step = 'manage_match'
+
+    def on_manage_match(self, state: DialogState, text: str):
+        answer = text.lower().strip(" .!")
+        if answer in YES_WORDS and state.match_id is not None:
+            r = self.store.get_reservation(state.match_id)
+            state.match_id = None
+            if r is None:
+                state.add_message("assistant", "Reservation not found anymore. Please enter your reservation ID.")
+                state.current_step = 'manage_id'
+                return
+            self.open_booking(state, r)
+        elif answer in NO_WORDS or state.match_id is None:
+            state.match_id = None
+            state.add_message("assistant", "Please enter your reservation ID, or a fuller name, email or phone.")
+            state.current_step = 'manage_id'
+        else:
+            state.add_message("assistant", "Please type **yes** or **no**.")
+
+    def open_booking(self, state: DialogState, r: dict):
+        if r.get('archived'):
+            state.add_message(
+                "assistant", format_reservation(r) + "\n\nThis booking is in the past and can no longer be changed."
+            )
+            state.current_step = 'await_intent'
+            return
+        state.editing_id = r['id']
+        state.add_message(
+            "assistant",
+            (
+                "Found it! What would you like to do?\n"
+                "• Type **update** to edit fields\n"
+                "• Type **cancel** to delete\n"
+                "• Type **show** to display details"
+            ),
+        )
+        state.current_step = 'manage_action'
+
+    def on_manage_action(self, state: DialogState, text: str):
+        act = text.lower()
+        if act == 'cancel':
+            if self.store.delete_reservation(state.editing_id):
+                state.add_message("assistant", "Reservation cancelled.")
+            else:
+                state.add_message("assistant", "Reservation not found anymore, so there was nothing to cancel.")
+            state.editing_id = None
+            state.current_step = 'greeting'
+        elif act == 'show':
+            r = self.store.get_reservation(state.editing_id)
+            if r:
+                state.add_message("assistant", format_reservation(r))
+            else:
+                state.add_message("assistant", "Reservation not found anymore.")
+        elif act == 'update':
+            r = self.store.get_reservation(state.editing_id)
+            if not r:
+                state.add_message("assistant", "Reservation not found anymore.")
+                return
+            # why: the correction step edits a full copy, confirm then writes it back
+            r.pop('id', None)
+            state.reservation_data = r
+            state.add_message("assistant", f"Which field to update? ({FIELD_LIST})")
+            state.current_step = 'correction'
+        else:
+            state.add_message("assistant", "Please type one of: update, cancel, show.")
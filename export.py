@@ -0,0 +1,170 @@
+"""
+Snapshot-consistent reservation exports.
+
+- CSV, JSONL and Parquet stream rows (archived and live) in chunks from one read transaction,
+  so memory is bounded by the chunk size and the file never mixes two writes
+- "sqlite" copies the database with SQLite's online backup API
+- Artifacts are cached next to the database and reused until the
+  reservations write-version changes
+
+    python export.py --format csv
+    python export.py --format sqlite --venue downtown
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import tempfile
+
+import db
+import metrics
+import venues
+
+CHUNK_SIZE = 1000
+
+FORMATS = {
+    # format: (file extension, mime type)
+    'csv': ('csv', 'text/csv'),
+    'jsonl': ('jsonl', 'application/x-ndjson'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'sqlite': ('db', 'application/octet-stream'),
+}
+
+COLUMNS = ('id', 'name', 'guests', 'date', 'time', 'email', 'phone', 'special_requests')
+
+
+def export_dir() -> str:
+    return os.path.join(os.path.dirname(db.get_pool().path) or '.', 'exports')
+
+
+def _artifact_prefix() -> str:
+    return os.path.splitext(os.path.basename(db.get_pool().path))[0] + '-v'
+
+
+def artifact_path(fmt: str, version: int) -> str:
+    return os.path.join(export_dir(), f"{_artifact_prefix()}{version}.{FORMATS[fmt][0]}")
+
+
+def iter_chunks(conn, chunk_size: int = CHUNK_SIZE):
+    """Yield lists of row tuples, archived bookings first; call inside the caller's read transaction."""
+    for table in ('reservations_archive', 'reservations'):
+        cursor = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM {table} ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            metrics.count('db_rows_read_total', len(rows))
+            yield [tuple(row) for row in rows]
+
+
+# ---------- Writers ----------
+
+def write_csv(conn, path: str, chunk_size: int = CHUNK_SIZE):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for chunk in iter_chunks(conn, chunk_size):
+            writer.writerows(chunk)
+
+
+def write_jsonl(conn, path: str, chunk_size: int = CHUNK_SIZE):
+    with open(path, 'w', encoding='utf-8') as f:
+        for chunk in iter_chunks(conn, chunk_size):
+            f.writelines(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + "\n" for row in chunk)
+
+
+def write_parquet(conn, path: str, chunk_size: int = CHUNK_SIZE):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow).")
+    schema = pa.schema([
+        ('id', pa.int64()), ('name', pa.string()), ('guests', pa.int64()), ('date', pa.string()),
+        ('time', pa.string()), ('email', pa.string()), ('phone', pa.string()), ('special_requests', pa.string()),
+    ])
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in iter_chunks(conn, chunk_size):
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*chunk), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+
+def write_sqlite(conn, path: str, chunk_size: int = CHUNK_SIZE):
+    dest = sqlite3.connect(path)
+    try:
+        # one step: the whole copy happens under a single read snapshot
+        conn.backup(dest)
+    finally:
+        dest.close()
+
+
+WRITERS = {
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+    'parquet': write_parquet,
+    'sqlite': write_sqlite,
+}
+
+
+# ---------- Cached export ----------
+
+@metrics.timed('export_seconds')
+def export(fmt: str, chunk_size: int = CHUNK_SIZE) -> str:
+    """Path to an export of the current data in `fmt`, generating it only if stale."""
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    os.makedirs(export_dir(), exist_ok=True)
+    with db.connection() as conn:
+        # why: BEGIN + first read pins a WAL snapshot; version and rows then agree
+        conn.execute("BEGIN")
+        try:
+            version = db.read_write_version(conn)
+            path = artifact_path(fmt, version)
+            if os.path.exists(path):
+                return path
+            fd, tmp = tempfile.mkstemp(dir=export_dir(), suffix='.part')
+            os.close(fd)
+            try:
+                if fmt == 'sqlite':
+                    os.remove(tmp)  # backup creates its own file
+                WRITERS[fmt](conn, tmp, chunk_size)
+                os.replace(tmp, path)
+                metrics.count('export_bytes_total', os.path.getsize(path), format=fmt)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+        finally:
+            conn.rollback()
+    _prune(fmt, keep=path)
+    return path
+
+
+def _prune(fmt: str, keep: str):
+    """Drop older artifacts of the same format."""
+    prefix, suffix = _artifact_prefix(), '.' + FORMATS[fmt][0]
+    for name in os.listdir(export_dir()):
+        full = os.path.join(export_dir(), name)
+        if name.startswith(prefix) and name.endswith(suffix) and full != keep:
+            try:
+                os.remove(full)
+            except OSError:
+                pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export reservations.")
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--venue', choices=list(venues.VENUES), help='export this venue (RESTAURANT_VENUES)')
+    args = parser.parse_args(argv)
+    if args.venue:
+        print(venues.run_in(venues.get_venue(args.venue), export, args.format, args.chunk_size))
+    else:
+        print(export(args.format, args.chunk_size))
+
+
+if __name__ == '__main__':
+    main()
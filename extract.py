@@ -0,0 +1,207 @@
+"""
+One-shot slot extraction from free-text booking messages.
+
+    extract_slots("table for 4 tomorrow at 7:30pm, John, john@x.com")
+    -> {'guests': '4', 'date': '<tomorrow>', 'time': '19:30', 'name': 'John', 'email': 'john@x.com'}
+
+Values come back as strings in the shape the dialog's step parsers accept, so
+they go through the same validation as typed answers. Every pattern is
+compiled once at import.
+"""
+
+import datetime
+import re
+
+NUMBER_WORDS = {
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+    'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'thirteen': 13,
+    'fourteen': 14, 'fifteen': 15, 'sixteen': 16, 'seventeen': 17, 'eighteen': 18,
+    'nineteen': 19, 'twenty': 20, 'a couple': 2, 'couple': 2,
+}
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+MONTHS = ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec')
+
+_NUMBER = r"\d{1,2}|" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True))
+_MONTH = r"(?P<month>jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+
+EMAIL_RE = re.compile(r"[\w\.-]+@[\w\.-]+\.[a-zA-Z]{2,}")
+ISO_DATE_RE = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+DAY_MONTH_RE = re.compile(rf"\b(?P<day>\d{{1,2}})(?:st|nd|rd|th)?(?:\s+of)?\s+{_MONTH}\b", re.I)
+MONTH_DAY_RE = re.compile(rf"\b{_MONTH}\s+(?P<day>\d{{1,2}})(?:st|nd|rd|th)?\b", re.I)
+RELATIVE_DATE_RE = re.compile(
+    r"\b(?P<word>day after tomorrow|today|tonight|tomorrow|tmrw)\b"
+    r"|\bin\s+(?P<days>\d{1,2})\s+days?\b"
+    rf"|\b(?:(?P<next>next|this)\s+|on\s+)?(?P<weekday>{'|'.join(WEEKDAYS)})\b",
+    re.I,
+)
+TIME_12H_RE = re.compile(r"\b(?P<hh>1[0-2]|0?[1-9])(?:[:.](?P<mm>[0-5]\d))?\s*(?P<ampm>[ap])\.?m\.?(?!\w)", re.I)
+TIME_24H_RE = re.compile(r"\b(?P<hh>[01]?\d|2[0-3])[:.](?P<mm>[0-5]\d)\b")
+TIME_WORD_RE = re.compile(r"\b(?P<word>noon|midday)\b", re.I)
+TIME_AT_RE = re.compile(r"\bat\s+(?P<hh>1[0-2]|[1-9])\b(?![:.]?\d)", re.I)
+GUESTS_RE = re.compile(
+    rf"\b(?:table\s+for|party\s+of|group\s+of|for)\s+(?P<a>{_NUMBER})\b(?!\s*(?:am|pm|:|\.\d|o'?clock))"
+    rf"|\b(?P<b>{_NUMBER})\s+(?:people|persons|guests|pax|adults|of\s+us|diners)\b",
+    re.I,
+)
+PHONE_RE = re.compile(r"(?<![\w@])\+?\(?\d[\d\s().-]{5,}\d(?!\w)")
+NAME_CUE_RE = re.compile(
+    r"\b(?i:name\s+is|name:|under\s+the\s+name(?:\s+of)?)"
+    r"\s+(?P<name>[A-Za-z][A-Za-z'\-]*(?:\s+[A-Za-z][A-Za-z'\-]*){0,2})"
+    # weaker cues ("I'm looking for...") only count when followed by a capitalized word
+    r"|\b(?i:i'm|i\s+am|this\s+is|under)\s+(?P<proper>[A-Z][A-Za-z'\-]*(?:\s+[A-Z][A-Za-z'\-]*){0,2})"
+)
+NAME_SEGMENT_RE = re.compile(r"^[A-Z][a-zA-Z'\-]*(?:\s+[A-Z][a-zA-Z'\-]*){0,2}$")
+
+BOOK_RE = re.compile(r"\b(?:book|reserv|table)", re.I)
+MANAGE_RE = re.compile(r"\b(?:manage|update|change|edit|cancel|modify)", re.I)
+HELP_RE = re.compile(r"\b(?:help|how|instructions)\b", re.I)
+
+# Words that can sit next to a name but are not part of it
+_NOT_NAMES = frozenset(
+    ('hi', 'hello', 'hey', 'thanks', 'please', 'yes', 'no', 'ok', 'okay', 'table', 'book', 'today',
+     'tonight', 'tomorrow', 'next', 'this', 'on', 'at', 'for', 'i', 'we', 'and', 'with', 'my',
+     'phone', 'email', 'tel')
+    + WEEKDAYS + MONTHS
+)
+
+
+def detect_intent(text: str):
+    # why: "manage my reservations" mentions a reservation but is not a new booking
+    if MANAGE_RE.search(text):
+        return 'manage'
+    if BOOK_RE.search(text):
+        return 'book'
+    if HELP_RE.search(text):
+        return 'help'
+    return None
+
+
+def _blank(text: str, match) -> str:
+    """Remove a matched span so later patterns don't re-read it."""
+    start, end = match.span()
+    return text[:start] + " " * (end - start) + text[end:]
+
+
+def _resolve_day_month(day: int, month_name: str, today: datetime.date):
+    month = MONTHS.index(month_name[:3].lower()) + 1
+    for year in (today.year, today.year + 1):
+        try:
+            candidate = datetime.date(year, month, day)
+        except ValueError:
+            return None
+        if candidate >= today:
+            return candidate
+    return None
+
+
+def _resolve_relative(match, today: datetime.date):
+    word = (match.group('word') or '').lower()
+    if word in ('today', 'tonight'):
+        return today
+    if word in ('tomorrow', 'tmrw'):
+        return today + datetime.timedelta(days=1)
+    if word == 'day after tomorrow':
+        return today + datetime.timedelta(days=2)
+    if match.group('days'):
+        return today + datetime.timedelta(days=int(match.group('days')))
+    weekday = WEEKDAYS.index(match.group('weekday').lower())
+    ahead = (weekday - today.weekday()) % 7
+    if (match.group('next') or '').lower() == 'next' and ahead == 0:
+        ahead = 7
+    return today + datetime.timedelta(days=ahead)
+
+
+def _first(pattern, text: str):
+    match = pattern.search(text)
+    return (match.group(), match) if match else (None, None)
+
+
+def _extract_date(text: str, today: datetime.date):
+    for pattern in (ISO_DATE_RE, DAY_MONTH_RE, MONTH_DAY_RE, RELATIVE_DATE_RE):
+        match = pattern.search(text)
+        if not match:
+            continue
+        if pattern is ISO_DATE_RE:
+            return match.group(1), match
+        if pattern is RELATIVE_DATE_RE:
+            return _resolve_relative(match, today).isoformat(), match
+        day = _resolve_day_month(int(match.group('day')), match.group('month'), today)
+        if day is not None:
+            return day.isoformat(), match
+    return None, None
+
+
+def _extract_time(text: str):
+    match = TIME_12H_RE.search(text)
+    if match:
+        hh = int(match.group('hh')) % 12 + (12 if match.group('ampm').lower() == 'p' else 0)
+        return f"{hh:02d}:{int(match.group('mm') or 0):02d}", match
+    match = TIME_24H_RE.search(text)
+    if match:
+        return f"{int(match.group('hh')):02d}:{match.group('mm')}", match
+    match = TIME_WORD_RE.search(text)
+    if match:
+        return "12:00", match
+    match = TIME_AT_RE.search(text)
+    if match:
+        # why: "at 7" at a restaurant that opens at 11 means the evening
+        hh = int(match.group('hh'))
+        return f"{hh + 12 if hh < 11 else hh:02d}:00", match
+    return None, None
+
+
+def _extract_guests(text: str):
+    match = GUESTS_RE.search(text)
+    if not match:
+        return None, None
+    raw = (match.group('a') or match.group('b')).lower()
+    return str(int(raw) if raw.isdigit() else NUMBER_WORDS[raw]), match
+
+
+def _extract_phone(text: str):
+    for match in PHONE_RE.finditer(text):
+        if sum(ch.isdigit() for ch in match.group()) >= 7:
+            return match.group().strip(), match
+    return None, None
+
+
+def _extract_name(original: str, remaining: str):
+    match = NAME_CUE_RE.search(remaining)
+    if match:
+        words = (match.group('name') or match.group('proper')).split()
+        while words and words[-1].lower() in _NOT_NAMES:
+            words.pop()
+        if words and words[0].lower() not in _NOT_NAMES:
+            return " ".join(words).title()
+    # A bare comma-separated segment that looks like a proper name: "..., John Smith, ..."
+    if "," not in original:
+        return None
+    for segment in remaining.split(","):
+        segment = segment.strip(" .!")
+        if NAME_SEGMENT_RE.match(segment) and segment.split()[0].lower() not in _NOT_NAMES:
+            return segment
+    return None
+
+
+def extract_slots(text: str, today: datetime.date = None) -> dict:
+    """Every booking field we can find in `text`; missing fields are simply absent."""
+    today = today or datetime.date.today()
+    slots = {}
+    remaining = text
+
+    for field, extractor in (
+        ('email', lambda t: _first(EMAIL_RE, t)),
+        ('date', lambda t: _extract_date(t, today)),
+        ('time', _extract_time),
+        ('guests', _extract_guests),
+        ('phone', _extract_phone),
+    ):
+        value, match = extractor(remaining)
+        if value is not None:
+            slots[field] = value
+            remaining = _blank(remaining, match)
+
+    name = _extract_name(text, remaining)
+    if name:
+        slots['name'] = name
+    return slots
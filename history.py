@@ -0,0 +1,58 @@
+"""
+Bounded chat history.
+
+MessageLog is a ring buffer of (role, content) tuples capped both by message
+count and by total characters, so a kiosk session left open all service
+keeps a fixed memory ceiling. Front ends render only a window of the most
+recent messages.
+"""
+
+import os
+from collections import deque, namedtuple
+from itertools import islice
+
+MAX_MESSAGES = int(os.environ.get('CHAT_HISTORY_MAX_MESSAGES', 200))
+MAX_CHARS = int(os.environ.get('CHAT_HISTORY_MAX_CHARS', 64_000))
+
+Message = namedtuple('Message', ('role', 'content'))
+
+_ROLES = {'user': 'user', 'assistant': 'assistant'}  # why: one shared str object per role
+
+
+class MessageLog:
+    __slots__ = ('_items', '_chars', 'max_messages', 'max_chars', 'dropped')
+
+    def __init__(self, max_messages: int = MAX_MESSAGES, max_chars: int = MAX_CHARS):
+        self._items = deque()
+        self._chars = 0
+        self.max_messages = max_messages
+        self.max_chars = max_chars
+        self.dropped = 0
+
+    def append(self, role: str, content: str):
+        self._items.append(Message(_ROLES.get(role, role), content))
+        self._chars += len(content)
+        # always keep the newest message, even if it alone exceeds max_chars
+        while len(self._items) > 1 and (len(self._items) > self.max_messages or self._chars > self.max_chars):
+            self._chars -= len(self._items.popleft().content)
+            self.dropped += 1
+
+    def clear(self):
+        self._items.clear()
+        self._chars = 0
+        self.dropped = 0
+
+    def window(self, count: int):
+        """The newest `count` messages, oldest first, and how many stored ones are hidden."""
+        count = max(0, min(count, len(self._items)))
+        hidden = len(self._items) - count
+        return list(islice(reversed(self._items), count))[::-1], hidden
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
@@ -0,0 +1,250 @@
+"""
+Bulk reservation import from CSV or JSONL.
+
+- Rows are streamed from the file and inserted with executemany, one write
+  transaction per chunk, so memory stays bounded by the chunk size
+- Every row goes through validation.validate_reservation; bad rows are
+  reported with their line number and skipped, the rest still import
+- A row matching an existing booking on (email, date, time), with the email
+  compared trimmed and case-folded, is skipped as a duplicate, including
+  repeats within the same file
+- Rows are seated on the floor plan in file order; a row that finds no free
+  table is refused like an invalid one, unless overbooking is allowed
+- Occupancy is updated for the inserted rows in the same transaction, and
+  their confirmation emails are marked skipped: the guests booked elsewhere
+
+    python importer.py bookings.csv
+    python importer.py bookings.jsonl --errors rejected.jsonl
+    python importer.py legacy.csv --allow-overbooking
+    python importer.py bookings.csv --venue downtown
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from itertools import islice
+
+import capacity
+import db
+import metrics
+import venues
+from validation import InvalidReservation, validate_reservation
+
+CHUNK_SIZE = 5000
+MAX_KEPT_ERRORS = 1000  # errors beyond this are counted (and written to --errors) but not kept
+
+_INSERT_SQL = """
+    INSERT INTO reservations (name, guests, date, time, email, phone, special_requests)
+    SELECT ?, ?, ?, ?, ?, ?, ?
+    WHERE NOT EXISTS (
+        SELECT 1 FROM reservations WHERE lower(trim(email)) = lower(trim(?)) AND date = ? AND time = ?
+    ) AND NOT EXISTS (
+        SELECT 1 FROM reservations_archive WHERE date = ? AND time = ? AND lower(trim(email)) = lower(trim(?))
+    )
+"""
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    full: int = 0  # refused: no free table at that time
+    errors: list = field(default_factory=list)  # (line, {field: reason}), first MAX_KEPT_ERRORS only
+    overbooked: list = field(default_factory=list)  # dates now over capacity
+
+    def summary(self) -> str:
+        text = f"{self.rows} rows: {self.inserted} imported, {self.duplicates} duplicates, {self.invalid} invalid"
+        if self.full:
+            text += f", {self.full} fully booked"
+        if self.overbooked:
+            text += f"; over capacity on {', '.join(self.overbooked[:10])}"
+            if len(self.overbooked) > 10:
+                text += f" and {len(self.overbooked) - 10} more dates"
+        return text
+
+
+# ---------- Readers ----------
+
+def read_csv(f):
+    """Yield (line number, row dict) from a CSV file with a header row."""
+    reader = csv.DictReader(f)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(f):
+    """Yield (line number, row) from JSON Lines; unparsable lines yield an error string."""
+    for line_no, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as e:
+            yield line_no, f"invalid JSON: {e}"
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+def _coerce(row) -> dict:
+    """CSV gives every value as text; accept "4" for guests and blanks as missing."""
+    if not isinstance(row, dict):
+        return row
+    row = {k.strip().lower(): v for k, v in row.items() if k and v is not None and v != ''}
+    guests = row.get('guests')
+    if isinstance(guests, str) and guests.strip().isdigit():
+        row['guests'] = int(guests)
+    return row
+
+
+# ---------- Import ----------
+
+def _write_chunk(conn, chunk, overbook: bool):
+    """Insert one validated chunk of (line, row); returns (rows inserted, dates touched, lines refused as full)."""
+    last_id = conn.execute("SELECT coalesce(max(id), 0) FROM reservations").fetchone()[0]
+    conn.executemany(
+        _INSERT_SQL,
+        (
+            (r['name'], r['guests'], r['date'], r['time'], r['email'], r['phone'], r['special_requests'],
+             r['email'], r['date'], r['time'], r['date'], r['time'], r['email'])
+            for _, r in chunk
+        ),
+    )
+    # why: we hold the write lock, so every id above last_id came from this chunk
+    added = conn.execute(
+        "SELECT id, date, time, guests, lower(trim(email)) FROM reservations WHERE id > ? ORDER BY id", (last_id,)
+    ).fetchall()
+    full = set(capacity.seat_bookings(conn, [row[:4] for row in added], overbook=overbook))
+    refused = []
+    if full:
+        conn.executemany("DELETE FROM reservations WHERE id = ?", ((rid,) for rid in full))
+        keys = {(row[4], row[1], row[2]) for row in added if row[0] in full}
+        # why: by key, not position; a repeat of a refused row in the same chunk is refused with it
+        refused = [line for line, r in chunk if (r['email'].strip().lower(), r['date'], r['time']) in keys]
+        added = [row for row in added if row[0] not in full]
+    conn.executemany(
+        "INSERT OR IGNORE INTO notifications_sent VALUES (?, 'confirmation', ?, ?, 'skipped', datetime('now'))",
+        ((row[0], row[1], row[2]) for row in added),
+    )
+    return len(added), sorted({row[1] for row in added}), refused
+
+
+def _overbooked(conn, dates) -> list:
+    over = capacity.over_capacity_sql(capacity.get_config())
+    found = []
+    for start in range(0, len(dates), 500):
+        chunk = dates[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        found += [row[0] for row in conn.execute(
+            f"SELECT DISTINCT date FROM occupancy WHERE date IN ({placeholders}) AND {over}",
+            chunk,
+        )]
+    return found
+
+
+def import_rows(rows, chunk_size: int = CHUNK_SIZE, on_error=None, allow_overbooking: bool = False) -> ImportReport:
+    """
+    Import (line number, row) pairs. Returns an ImportReport.
+
+    `on_error(line, errors)` is called for every rejected row. Rows that find
+    no free table are refused; with `allow_overbooking` (bookings that already
+    exist elsewhere) they are kept and the dates over capacity are reported.
+    """
+    report = ImportReport()
+    venue = venues.current()
+
+    def reject(line, errors):
+        if len(report.errors) < MAX_KEPT_ERRORS:
+            report.errors.append((line, errors))
+        if on_error is not None:
+            on_error(line, errors)
+
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            break
+        valid = []
+        for line, row in batch:
+            report.rows += 1
+            try:
+                if isinstance(row, str):
+                    raise InvalidReservation({'row': row})
+                valid.append((line, validate_reservation(_coerce(row), opening=venue.opening, closing=venue.closing)))
+            except InvalidReservation as e:
+                report.invalid += 1
+                reject(line, e.errors)
+        if not valid:
+            continue
+        with metrics.span('db_op_seconds', op='import_chunk'), db.transaction() as conn:
+            inserted, dates, full = _write_chunk(conn, valid, allow_overbooking)
+            over = _overbooked(conn, dates)
+        report.inserted += inserted
+        report.full += len(full)
+        report.duplicates += len(valid) - inserted - len(full)
+        report.overbooked += [d for d in over if d not in report.overbooked]
+        for line in full:
+            reject(line, {'time': "fully booked: no free table"})
+    return report
+
+
+def import_file(path: str, fmt: str = None, chunk_size: int = CHUNK_SIZE, on_error=None,
+                allow_overbooking: bool = False) -> ImportReport:
+    """Import a .csv or .jsonl file (format from the extension unless given)."""
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt == 'ndjson':
+        fmt = 'jsonl'
+    if fmt not in READERS:
+        raise ValueError(f"Unknown import format: {fmt}")
+    with open(path, newline='' if fmt == 'csv' else None, encoding='utf-8-sig') as f:
+        return import_rows(READERS[fmt](f), chunk_size=chunk_size, on_error=on_error,
+                           allow_overbooking=allow_overbooking)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import reservations from CSV or JSONL.")
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=sorted(READERS), help='default: from the file extension')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='rows per transaction')
+    parser.add_argument('--errors', help='write rejected rows as JSON lines to this file')
+    parser.add_argument('--allow-overbooking', action='store_true',
+                        help='keep rows that find no free table (bookings that already exist elsewhere)')
+    parser.add_argument('--db', help='database path (default: RESERVATIONS_DB)')
+    parser.add_argument('--venue', choices=list(venues.VENUES), help='import into this venue (RESTAURANT_VENUES)')
+    args = parser.parse_args(argv)
+    if args.db:
+        db.configure(args.db)
+
+    errors_file = open(args.errors, 'w', encoding='utf-8') if args.errors else None
+    try:
+        def on_error(line, errors):
+            if errors_file is not None:
+                errors_file.write(json.dumps({'line': line, 'errors': errors}) + "\n")
+
+        if args.venue:
+            report = venues.run_in(venues.get_venue(args.venue), import_file, args.path, args.format,
+                                   args.chunk_size, on_error, args.allow_overbooking)
+        else:
+            report = import_file(args.path, args.format, args.chunk_size, on_error, args.allow_overbooking)
+    finally:
+        if errors_file is not None:
+            errors_file.close()
+    print(report.summary())
+    if errors_file is None:
+        for line, errors in report.errors[:20]:
+            print(f"  line {line}: " + ", ".join(f"{k} {v}" for k, v in errors.items()))
+        if report.invalid + report.full > 20:
+            print(f"  ... {report.invalid + report.full - 20} more (use --errors FILE for all)")
+    return 0 if report.invalid + report.full == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
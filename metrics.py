@@ -0,0 +1,239 @@
+"""
+Lightweight timing and counters.
+
+- @timed(name, **labels) and span(name, **labels) record durations into
+  fixed-bucket histograms; count(name, n) bumps a counter
+- Off unless RESTAURANT_METRICS=1 (or enable()); while off, every call site
+  costs one global check
+- render_prometheus(), write_textfile(path) and start_http_server(port)
+  expose everything in the Prometheus text format
+"""
+
+import bisect
+import functools
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENABLED = os.environ.get('RESTAURANT_METRICS', '') not in ('', '0', 'false')
+
+# Seconds; wide enough for a sub-millisecond dialog step and a multi-second export
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+HELP = {
+    'db_op_seconds': "Time spent in SQLite helpers",
+    'dialog_step_seconds': "Time to handle one chat turn, by dialog step",
+    'ui_section_seconds': "Time to run one section of the Streamlit script",
+    'db_rows_read_total': "Reservation rows read by query helpers",
+    'export_bytes_total': "Bytes written by exports",
+    'db_lock_retries_total': "Write transactions retried after SQLITE_BUSY",
+    'db_group_commit_ops_total': "Writes applied by the group-commit writer",
+    'export_seconds': "Time to produce (or reuse) an export artifact",
+    'notifications_sent_total': "Confirmation and reminder emails accepted by the SMTP server",
+    'notifications_failed_total': "Emails the SMTP server refused",
+    'rate_limited_total': "Chat inputs rejected by the per-session or per-client rate limit",
+}
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'count', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+
+_histograms = {}
+_counters = {}
+_lock = threading.Lock()
+
+
+def enable(on: bool = True):
+    global ENABLED
+    ENABLED = on
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def _key(name: str, labels: dict):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name: str, seconds: float, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram()
+        hist.observe(seconds)
+
+
+def count(name: str, n: int = 1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+class _Span:
+    __slots__ = ('name', 'labels', 'start')
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **labels):
+    """`with span('ui_section_seconds', section='viewer'):` times the block."""
+    if not ENABLED:
+        return _NOOP
+    return _Span(name, labels)
+
+
+def timed(name: str, **labels):
+    """Decorator form of span()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start, **labels)
+        return wrapper
+    return decorate
+
+
+# ---------- Export ----------
+
+def _labels(pairs, extra=()) -> str:
+    items = list(pairs) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in items) + "}"
+
+
+def render_prometheus() -> str:
+    with _lock:
+        histograms = {k: (list(h.counts), h.total, h.count) for k, h in _histograms.items()}
+        counters = dict(_counters)
+    lines = []
+    seen = set()
+    for (name, labels), (counts, total, n) in sorted(histograms.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, c in zip(BUCKETS, counts):
+            cumulative += c
+            lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {n}")
+        lines.append(f"{name}_sum{_labels(labels)} {total}")
+        lines.append(f"{name}_count{_labels(labels)} {n}")
+    for (name, labels), value in sorted(counters.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    """Rows for an admin table: one per histogram/counter series."""
+    with _lock:
+        rows = [
+            {
+                'metric': name + _labels(labels),
+                'count': h.count,
+                'avg_ms': round(h.total / h.count * 1000, 3) if h.count else 0.0,
+                'max_ms': round(h.max * 1000, 3),
+                'total_ms': round(h.total * 1000, 1),
+            }
+            for (name, labels), h in sorted(_histograms.items())
+        ]
+        rows += [
+            {'metric': name + _labels(labels), 'count': value, 'avg_ms': None, 'max_ms': None, 'total_ms': None}
+            for (name, labels), value in sorted(_counters.items())
+        ]
+    return rows
+
+
+_last_textfile = 0.0
+
+
+def write_textfile(path: str, min_interval: float = 0.0):
+    """Atomically write the exposition (node_exporter textfile collector format)."""
+    global _last_textfile
+    now = time.monotonic()
+    if now - _last_textfile < min_interval:
+        return
+    _last_textfile = now
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
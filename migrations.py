@@ -0,0 +1,297 @@
+"""
+Schema migrations for the reservations database.
+
+- The schema version lives in PRAGMA user_version
+- MIGRATIONS run in order, each in its own write transaction, and only once
+- db.py applies them when a database is first opened in a process
+
+To change the schema, append a new (version, function) pair; never edit one
+that has shipped.
+"""
+
+import sqlite3
+
+import capacity
+
+
+def _table_sql(conn, table: str):
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    return row[0] if row else None
+
+
+def add_column(conn, table: str, column: str, decl: str):
+    """ALTER TABLE ... ADD COLUMN, skipped if the column already exists."""
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+RESERVATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        guests INTEGER,
+        date TEXT,
+        time TEXT,
+        email TEXT,
+        phone TEXT,
+        special_requests TEXT
+    )
+"""
+
+
+def v1_reservations(conn):
+    conn.execute(RESERVATIONS_TABLE.format(name='reservations'))
+
+
+def v2_autoincrement(conn):
+    # why: tables created before IDs were AUTOINCREMENT can reuse the ID of a deleted newest booking
+    if 'AUTOINCREMENT' in (_table_sql(conn, 'reservations') or '').upper():
+        return
+    conn.execute(RESERVATIONS_TABLE.format(name='reservations_new'))
+    conn.execute(
+        """
+        INSERT INTO reservations_new (id, name, guests, date, time, email, phone, special_requests)
+        SELECT id, name, guests, date, time, email, phone, special_requests FROM reservations
+        """
+    )
+    conn.execute("DROP TABLE reservations")
+    conn.execute("ALTER TABLE reservations_new RENAME TO reservations")
+
+
+def v3_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reservations_date_time ON reservations (date, time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reservations_email ON reservations (email)")
+
+
+def v4_write_version(conn):
+    # why: a cheap, cross-process "something changed" signal for read caches
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('write_version', 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS reservations_version_{event.lower()}
+            AFTER {event} ON reservations
+            BEGIN
+                UPDATE meta SET value = value + 1 WHERE key = 'write_version';
+            END
+            """
+        )
+
+
+def v5_occupancy(conn):
+    capacity.ensure_occupancy(conn)
+
+
+def v6_archive(conn):
+    # why: past bookings move here (see archive.py) so the live table only holds upcoming ones
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reservations_archive (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            guests INTEGER,
+            date TEXT,
+            time TEXT,
+            email TEXT,
+            phone TEXT,
+            special_requests TEXT,
+            archived_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_archive_date_time ON reservations_archive (date, time)")
+
+
+# Digits only, so "555-123 4567" and "5551234567" index the same
+PHONE_DIGITS_SQL = "replace(replace(replace(replace(replace({col}, ' ', ''), '-', ''), '(', ''), ')', ''), '+', '')"
+
+
+def v7_search(conn):
+    # why: name/contact lookups for staff who don't have the reservation ID
+    try:
+        conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS reservations_fts USING fts5(
+                name, email, phone, special_requests, tokenize = 'trigram'
+            )
+            """
+        )
+    except sqlite3.OperationalError:
+        return  # SQLite built without FTS5 (or older than 3.34); db.search_reservations falls back to LIKE
+    fields = "name, email, phone, special_requests"
+
+    def values(row):
+        return f"{row}.name, {row}.email, {PHONE_DIGITS_SQL.format(col=row + '.phone')}, {row}.special_requests"
+
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS reservations_fts_insert AFTER INSERT ON reservations BEGIN
+            INSERT INTO reservations_fts (rowid, {fields}) VALUES (new.id, {values('new')});
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS reservations_fts_delete AFTER DELETE ON reservations BEGIN
+            DELETE FROM reservations_fts WHERE rowid = old.id;
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS reservations_fts_update
+        AFTER UPDATE OF name, email, phone, special_requests ON reservations BEGIN
+            DELETE FROM reservations_fts WHERE rowid = old.id;
+            INSERT INTO reservations_fts (rowid, {fields}) VALUES (new.id, {values('new')});
+        END
+        """
+    )
+    conn.execute("DELETE FROM reservations_fts")
+    conn.execute(
+        f"INSERT INTO reservations_fts (rowid, {fields}) SELECT id, {values('reservations')} FROM reservations"
+    )
+
+
+def v8_notifications(conn):
+    # why: notifier.py claims a row here before sending, so reruns never email twice
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS notifications_sent (
+            reservation_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            status TEXT NOT NULL,
+            sent_at TEXT NOT NULL,
+            PRIMARY KEY (reservation_id, kind, date, time)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notifications_date ON notifications_sent (date)")
+    # why: bookings made before this are confirmed already; without a row the first pass would email them all
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO notifications_sent
+        SELECT id, 'confirmation', date, time, 'skipped', datetime('now') FROM reservations
+        WHERE date IS NOT NULL AND time IS NOT NULL
+        """
+    )
+
+
+# One booking per guest per slot; db.py, importer.py and the unique index all use this key
+BOOKING_KEY_SQL = "lower(trim({col}email)), {col}date, {col}time"
+
+
+def create_duplicates_table(conn):
+    # why: not reservations_archive; archived rows read as past bookings and count in daily totals
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reservations_duplicates (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            guests INTEGER,
+            date TEXT,
+            time TEXT,
+            email TEXT,
+            phone TEXT,
+            special_requests TEXT,
+            duplicate_of INTEGER NOT NULL,
+            quarantined_at TEXT NOT NULL
+        )
+        """
+    )
+
+
+def v9_unique_bookings(conn):
+    # why: double confirms and client retries must not become two bookings, whoever the caller is
+    create_duplicates_table(conn)
+    key = BOOKING_KEY_SQL.format(col='')
+    # the oldest booking stays live; later copies are set aside for staff to review, not lost
+    moved = conn.execute(
+        f"""
+        INSERT INTO reservations_duplicates
+            (id, name, guests, date, time, email, phone, special_requests, duplicate_of, quarantined_at)
+        SELECT id, name, guests, date, time, email, phone, special_requests, duplicate_of, datetime('now')
+        FROM (
+            SELECT *,
+                   first_value(id) OVER (PARTITION BY {key} ORDER BY id) AS duplicate_of,
+                   row_number() OVER (PARTITION BY {key} ORDER BY id) AS n
+            FROM reservations WHERE email IS NOT NULL
+        ) WHERE n > 1
+        """
+    ).rowcount
+    if moved:
+        capacity.ensure_occupancy(conn)  # current occupancy schema, before rebuilding dates below
+        dates = [row[0] for row in conn.execute("SELECT DISTINCT date FROM reservations_duplicates")]
+        conn.execute("DELETE FROM reservations WHERE id IN (SELECT id FROM reservations_duplicates)")
+        capacity.rebuild_occupancy(conn, dates)
+    conn.execute(
+        f"CREATE UNIQUE INDEX IF NOT EXISTS idx_reservations_booking_key "
+        f"ON reservations ({key})"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key TEXT PRIMARY KEY,
+            reservation_id INTEGER NOT NULL,
+            request_hash TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def v10_seating(conn):
+    # why: bookings now hold specific table sizes; ensure_occupancy adds the column and re-seats existing ones
+    capacity.ensure_occupancy(conn)
+
+
+MIGRATIONS = (
+    (1, v1_reservations),
+    (2, v2_autoincrement),
+    (3, v3_indexes),
+    (4, v4_write_version),
+    (5, v5_occupancy),
+    (6, v6_archive),
+    (7, v7_search),
+    (8, v8_notifications),
+    (9, v9_unique_bookings),
+    (10, v10_seating),
+)
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn) -> int:
+    """Apply pending migrations; safe to race with other processes. Returns the final version."""
+    if schema_version(conn) >= SCHEMA_VERSION:
+        return schema_version(conn)
+    for version, step in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # re-read under the write lock: another process may have got here first
+            if schema_version(conn) < version:
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return schema_version(conn)
+
+
+def prepare(conn):
+    """Run on every process start: migrate, then re-check config-dependent derived data."""
+    migrate(conn)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        capacity.ensure_occupancy(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
@@ -0,0 +1,288 @@
+"""
+Confirmation and reminder emails.
+
+- Due bookings are streamed in keyset pages over the (date, time) index, never
+  loaded whole
+- Each page is claimed in notifications_sent before it is sent, so reruns and
+  concurrent workers never email twice; a booking moved to another date or
+  time is confirmed again
+- Messages go out over one reused SMTP connection, paced to NOTIFY_RATE per
+  second
+- A claim left 'sending' by a crash is not retried: at most once beats twice
+- Bookings that predate notifications, and imported ones, are recorded as
+  'skipped' confirmations (see migrations.py, importer.py), so only new
+  bookings are confirmed; they still get reminders
+
+    python notifier.py --once                                   # send what is due, then exit
+    python notifier.py --smtp-host localhost --smtp-port 1025   # keep running (local stand-in)
+"""
+
+import argparse
+import datetime
+import logging
+import os
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+
+import db
+import metrics
+import venues
+
+SMTP_HOST = os.environ.get('SMTP_HOST')  # unset: the app and API don't start the worker
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 25))
+SMTP_USER = os.environ.get('SMTP_USER')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '') == '1'
+NOTIFY_FROM = os.environ.get('NOTIFY_FROM', 'reservations@localhost')
+NOTIFY_RATE = float(os.environ.get('NOTIFY_RATE', 5))  # messages per second
+NOTIFY_INTERVAL_S = float(os.environ.get('NOTIFY_INTERVAL_S', 60))
+REMINDER_HOURS = float(os.environ.get('REMINDER_HOURS', 24))
+BATCH_SIZE = 50
+
+KINDS = ('confirmation', 'reminder')
+END_OF_TIME = ('9999-12-31', '99:99')
+
+log = logging.getLogger(__name__)
+
+_DUE_SQL = """
+    SELECT r.id, r.name, r.guests, r.date, r.time, r.email FROM reservations r
+    WHERE (r.date, r.time, r.id) > (?, ?, ?) AND (r.date, r.time) < (?, ?) AND r.email LIKE '%@%'
+      AND NOT EXISTS (
+          SELECT 1 FROM notifications_sent n
+          WHERE n.reservation_id = r.id AND n.kind = ? AND n.date = r.date AND n.time = r.time
+      )
+      {extra}
+    ORDER BY r.date, r.time, r.id LIMIT ?
+"""
+
+# why: a booking confirmed within the reminder window already has the details in the inbox
+_NOT_JUST_CONFIRMED = """
+      AND NOT EXISTS (
+          SELECT 1 FROM notifications_sent c
+          WHERE c.reservation_id = r.id AND c.kind = 'confirmation' AND c.date = r.date AND c.time = r.time
+            AND c.status = 'sent' AND c.sent_at > datetime('now', ?)
+      )
+"""
+
+
+# ---------- Due bookings ----------
+
+def iter_due(kind: str, start: tuple, end: tuple, batch_size: int = BATCH_SIZE):
+    """Yield pages of bookings with start <= (date, time) < end that have no `kind` notice yet."""
+    extra, extra_params = ("", ()) if kind != 'reminder' else (_NOT_JUST_CONFIRMED, (f"-{REMINDER_HOURS} hours",))
+    sql = _DUE_SQL.format(extra=extra)
+    after = (*start, 0)
+    while True:
+        with db.connection() as conn:
+            rows = conn.execute(sql, (*after, *end, kind, *extra_params, batch_size)).fetchall()
+        if not rows:
+            return
+        metrics.count('db_rows_read_total', len(rows))
+        yield [dict(row) for row in rows]
+        last = rows[-1]
+        after = (last['date'], last['time'], last['id'])
+
+
+def _claim(kind: str, rows) -> list:
+    """Record `rows` as being sent; returns the ones no other worker got to first."""
+    claimed = []
+    with db.transaction() as conn:
+        for r in rows:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO notifications_sent VALUES (?, ?, ?, ?, 'sending', datetime('now'))",
+                (r['id'], kind, r['date'], r['time']),
+            )
+            if cursor.rowcount:
+                claimed.append(r)
+    return claimed
+
+
+def _finish(kind: str, results):
+    """Store each (row, status); status None releases the claim so the next run retries it."""
+    if not results:
+        return
+    keys = [(r['id'], kind, r['date'], r['time']) for r, status in results if status is None]
+    done = [(status, r['id'], kind, r['date'], r['time']) for r, status in results if status is not None]
+    with db.transaction() as conn:
+        conn.executemany(
+            "DELETE FROM notifications_sent WHERE reservation_id = ? AND kind = ? AND date = ? AND time = ?", keys
+        )
+        conn.executemany(
+            "UPDATE notifications_sent SET status = ?, sent_at = datetime('now') "
+            "WHERE reservation_id = ? AND kind = ? AND date = ? AND time = ?",
+            done,
+        )
+
+
+# ---------- Messages ----------
+
+def compose(kind: str, r: dict, venue: venues.Venue, sender: str = NOTIFY_FROM) -> EmailMessage:
+    when = datetime.datetime.strptime(f"{r['date']} {r['time']}", "%Y-%m-%d %H:%M")
+    msg = EmailMessage()
+    msg['From'] = sender
+    msg['To'] = r['email']
+    if kind == 'confirmation':
+        msg['Subject'] = f"Your table at {venue.name} is confirmed"
+        intro = "Thank you for booking with us. Your reservation is confirmed:"
+    else:
+        msg['Subject'] = f"Reminder: your table at {venue.name}, {when:%A} at {when:%H:%M}"
+        intro = "We look forward to seeing you soon. A reminder of your reservation:"
+    contact = f" or call us at {venue.phone}" if venue.phone else ""
+    msg.set_content(
+        f"Hi {r['name']},\n\n"
+        f"{intro}\n\n"
+        f"  Date:   {when:%A %d %B %Y}\n"
+        f"  Time:   {when:%H:%M}\n"
+        f"  Guests: {r['guests']}\n"
+        f"  Reservation ID: {r['id']}\n\n"
+        f"To change or cancel, use our booking chat with your reservation ID{contact}.\n\n"
+        f"{venue.name}\n{venue.address}\n"
+    )
+    return msg
+
+
+class Mailer:
+    """One SMTP connection, opened on first use and reused, sending at most `rate` messages a second."""
+
+    def __init__(self, host: str = None, port: int = None, user: str = SMTP_USER, password: str = SMTP_PASSWORD,
+                 starttls: bool = SMTP_STARTTLS, sender: str = NOTIFY_FROM, rate: float = NOTIFY_RATE):
+        self.host = host or SMTP_HOST or 'localhost'
+        self.port = port or SMTP_PORT
+        self.user, self.password, self.starttls = user, password, starttls
+        self.sender = sender
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.smtp = None
+        self._next_at = 0.0
+
+    def _connect(self):
+        self.smtp = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            self.smtp.starttls()
+        if self.user:
+            self.smtp.login(self.user, self.password or "")
+
+    def send(self, msg: EmailMessage):
+        delay = self._next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._next_at = max(self._next_at, time.monotonic()) + self.interval
+        if self.smtp is None:
+            self._connect()
+        try:
+            self.smtp.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # why: servers drop idle connections; one reconnect, then give up on this run
+            self._connect()
+            self.smtp.send_message(msg)
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except smtplib.SMTPException:
+                pass
+            self.smtp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------- Sending ----------
+
+def send_due(mailer: Mailer, now: datetime.datetime = None, batch_size: int = BATCH_SIZE) -> dict:
+    """Send every due confirmation, then reminder, for the current venue; returns counts per kind."""
+    now = now or datetime.datetime.now()
+    soon = now + datetime.timedelta(hours=REMINDER_HOURS)
+    start = (now.date().isoformat(), f"{now:%H:%M}")
+    windows = {
+        'confirmation': (start, END_OF_TIME),
+        'reminder': (start, (soon.date().isoformat(), f"{soon:%H:%M}")),
+    }
+    venue = venues.current()
+    counts = dict.fromkeys((*KINDS, 'failed'), 0)
+    for kind in KINDS:
+        for page in iter_due(kind, *windows[kind], batch_size=batch_size):
+            results = [(r, None) for r in _claim(kind, page)]
+            try:
+                for i, (r, _) in enumerate(results):
+                    try:
+                        mailer.send(compose(kind, r, venue, mailer.sender))
+                        results[i] = (r, 'sent')
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused):
+                        results[i] = (r, 'failed')  # why: a bad address fails the same way on every retry
+            finally:
+                # why: on a dropped connection the unsent claims are released for the next run
+                _finish(kind, results)
+            sent = sum(status == 'sent' for _, status in results)
+            failed = sum(status == 'failed' for _, status in results)
+            counts[kind] += sent
+            counts['failed'] += failed
+            metrics.count('notifications_sent_total', sent, kind=kind)
+            metrics.count('notifications_failed_total', failed, kind=kind)
+    return counts
+
+
+def send_all(mailer: Mailer, now: datetime.datetime = None) -> dict:
+    """send_due() for every venue in turn, over the same connection; {slug: counts}."""
+    return {v.slug: venues.run_in(v, send_due, mailer, now) for v in venues.all_venues()}
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def start_worker(interval_s: float = NOTIFY_INTERVAL_S):
+    """Send due notices every `interval_s` in a daemon thread; idempotent, and a no-op without SMTP_HOST."""
+    global _worker
+    if not SMTP_HOST:
+        return None
+
+    def loop():
+        while True:
+            try:
+                with Mailer() as mailer:
+                    send_all(mailer)
+            except Exception:
+                # why: an unreachable mail server just means we try again next interval
+                log.exception("Sending notifications failed")
+            time.sleep(interval_s)
+
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=loop, name="reservation-notifier", daemon=True)
+            _worker.start()
+    return _worker
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Email booking confirmations and reminders.")
+    parser.add_argument('--once', action='store_true', help='send what is due now, then exit')
+    parser.add_argument('--interval', type=float, default=NOTIFY_INTERVAL_S, help='seconds between passes')
+    parser.add_argument('--smtp-host', default=SMTP_HOST or 'localhost')
+    parser.add_argument('--smtp-port', type=int, default=SMTP_PORT)
+    parser.add_argument('--starttls', action='store_true', default=SMTP_STARTTLS)
+    parser.add_argument('--sender', default=NOTIFY_FROM)
+    parser.add_argument('--rate', type=float, default=NOTIFY_RATE, help='messages per second (0: unlimited)')
+    parser.add_argument('--db', help='database path (default: RESERVATIONS_DB)')
+    args = parser.parse_args(argv)
+    if args.db:
+        db.configure(args.db)
+
+    while True:
+        with Mailer(args.smtp_host, args.smtp_port, starttls=args.starttls, sender=args.sender,
+                    rate=args.rate) as mailer:
+            for slug, counts in send_all(mailer).items():
+                print(f"{slug}: {counts['confirmation']} confirmations, {counts['reminder']} reminders, "
+                      f"{counts['failed']} refused")
+        if args.once:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+In-memory token-bucket rate limits for chat input.
+
+- Each key (a chat session, a client address) gets a bucket of `burst`
+  tokens that refills at `rate` per second; allow() is O(1)
+- Buckets are kept in least-recently-used order and dropped once idle long
+  enough to be full again, so memory follows active clients (and is capped
+  at MAX_KEYS)
+- Limits are per process; each replica counts on its own
+- The per-client limit is off unless CLIENT_ADDRESS_FROM says where the
+  client's address comes from: "peer" (the app faces the internet directly)
+  or a header a trusted reverse proxy sets, e.g. "X-Forwarded-For"; behind a
+  proxy the peer address is the proxy's, shared by every visitor
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+CHAT_RATE_PER_MINUTE = float(os.environ.get('CHAT_RATE_PER_MINUTE', 30))
+CHAT_BURST = int(os.environ.get('CHAT_BURST', 10))
+CLIENT_RATE_PER_MINUTE = float(os.environ.get('CLIENT_RATE_PER_MINUTE', 120))
+CLIENT_BURST = int(os.environ.get('CLIENT_BURST', 40))
+CLIENT_ADDRESS_FROM = os.environ.get('CLIENT_ADDRESS_FROM', '')  # '', 'peer' or a header name
+MAX_KEYS = 100_000
+
+
+class TokenBucketLimiter:
+    def __init__(self, rate: float, burst: int, max_keys: int = MAX_KEYS):
+        self.rate = rate  # tokens per second
+        self.burst = burst
+        self.max_keys = max_keys
+        # why: an idle bucket refills to `burst` after this long, exactly like a new one, so it can go
+        self.ttl = burst / rate
+        self._buckets = OrderedDict()  # key -> (tokens, last update), least recently used first
+        self._lock = threading.Lock()
+
+    def _tokens(self, key, now: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return float(self.burst)
+        tokens, updated = bucket
+        return min(float(self.burst), tokens + (now - updated) * self.rate)
+
+    def allow(self, key, cost: float = 1.0) -> bool:
+        """Spend `cost` tokens from key's bucket if it has them."""
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._tokens(key, now)
+            allowed = tokens >= cost
+            self._buckets[key] = (tokens - cost if allowed else tokens, now)
+            self._buckets.move_to_end(key)
+            self._expire(now)
+        return allowed
+
+    def retry_after(self, key, cost: float = 1.0) -> float:
+        """Seconds until `cost` tokens are available for key (0 if they are now)."""
+        with self._lock:
+            tokens = self._tokens(key, time.monotonic())
+        return max(0.0, (cost - tokens) / self.rate)
+
+    def _expire(self, now: float):
+        buckets = self._buckets
+        while buckets:
+            key, (_, updated) = next(iter(buckets.items()))
+            if now - updated < self.ttl and len(buckets) <= self.max_keys:
+                return
+            buckets.popitem(last=False)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+sessions = TokenBucketLimiter(CHAT_RATE_PER_MINUTE / 60, CHAT_BURST)
+clients = TokenBucketLimiter(CLIENT_RATE_PER_MINUTE / 60, CLIENT_BURST)
+
+
+def client_address(headers, peer: str = None, source: str = None):
+    """The address to rate-limit a client by, per CLIENT_ADDRESS_FROM; None when the client limit is off."""
+    source = CLIENT_ADDRESS_FROM if source is None else source
+    if not source:
+        return None
+    if source.lower() == 'peer':
+        return peer
+    headers = headers or {}
+    # why: a repeated header arrives as several values; the last one is the nearest proxy's
+    values = headers.get_all(source) if hasattr(headers, 'get_all') else [headers.get(source)]
+    value = ",".join(v for v in values if v)
+    if not value:
+        return None
+    # why: proxies append to X-Forwarded-For; only the last entry was written by ours, earlier ones came from the client
+    return value.split(',')[-1].strip() or None
+
+
+def check(session: str, client: str = None) -> float:
+    """0.0 if this chat input may go ahead, else seconds to wait; the session is checked first."""
+    if not sessions.allow(session):
+        metrics.count('rate_limited_total', scope='session')
+        return sessions.retry_after(session)
+    if client is not None and not clients.allow(client):
+        metrics.count('rate_limited_total', scope='client')
+        return clients.retry_after(client)
+    return 0.0
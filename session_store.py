@@ -0,0 +1,188 @@
+"""
+Durable chat sessions.
+
+- Each conversation's DialogState is checkpointed, as versioned, compressed
+  JSON, into its own SQLite file (SESSIONS_DB), apart from reservations.db so
+  checkpoints never wait on the booking write lock
+- checkpoint() only snapshots the state; a background thread serializes and
+  writes the newest snapshot per session, so the render path never touches disk
+- A session resumes from its token (the ?session= query parameter in the app)
+  in any process that can reach the file
+- Sessions idle longer than SESSION_TTL_HOURS are evicted
+"""
+
+import atexit
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+import zlib
+
+import db
+import metrics
+from dialog import DialogState
+
+SESSIONS_DB = os.environ.get('SESSIONS_DB', 'data/sessions.db')
+SESSION_TTL_HOURS = float(os.environ.get('SESSION_TTL_HOURS', 24))
+FORMAT_VERSION = 1
+EVICT_EVERY_S = 600
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        token TEXT PRIMARY KEY,
+        format INTEGER NOT NULL,
+        state BLOB NOT NULL,
+        updated_at INTEGER NOT NULL
+    ) WITHOUT ROWID
+"""
+
+
+def new_token() -> str:
+    return secrets.token_urlsafe(16)
+
+
+def dump(state: dict) -> bytes:
+    return zlib.compress(json.dumps(state, separators=(',', ':'), ensure_ascii=False).encode(), 6)
+
+
+def load_state(blob: bytes, fmt: int):
+    """DialogState from a stored blob, or None if it was written by an unknown format."""
+    if fmt != FORMAT_VERSION:
+        return None
+    return DialogState.from_dict(json.loads(zlib.decompress(blob)))
+
+
+class SessionStore:
+    def __init__(self, path: str = SESSIONS_DB, ttl_hours: float = SESSION_TTL_HOURS):
+        self.pool = db.ConnectionPool(path, size=2)
+        self.ttl = ttl_hours * 3600
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._last_evict = 0.0
+        conn = self.pool.acquire()
+        try:
+            conn.execute(_SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions (updated_at)")
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+
+    def load(self, token: str):
+        """The saved DialogState for `token`, or None if unknown, expired or unreadable."""
+        with self._lock:
+            pending = self._pending.get(token)
+        if pending is not None:
+            return DialogState.from_dict(pending[0])
+        conn = self.pool.acquire()
+        try:
+            row = conn.execute(
+                "SELECT format, state FROM sessions WHERE token = ? AND updated_at >= ?",
+                (token, int(time.time() - self.ttl)),
+            ).fetchone()
+        finally:
+            self.pool.release(conn)
+        if row is None:
+            return None
+        try:
+            return load_state(row['state'], row['format'])
+        except (ValueError, zlib.error):
+            return None
+
+    def checkpoint(self, token: str, state: DialogState):
+        """Queue a snapshot of `state`; only the newest per token is written."""
+        snapshot = state.to_dict()
+        with self._lock:
+            self._pending[token] = (snapshot, int(time.time()))
+        self._ensure_thread()
+        self._wake.set()
+
+    def delete(self, token: str):
+        with self._lock:
+            self._pending.pop(token, None)
+        conn = self.pool.acquire()
+        try:
+            conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+
+    def evict(self) -> int:
+        """Drop sessions idle longer than the TTL; returns how many."""
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.execute("DELETE FROM sessions WHERE updated_at < ?", (int(time.time() - self.ttl),))
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+        self._last_evict = time.monotonic()
+        return cursor.rowcount
+
+    def flush(self):
+        """Write every pending snapshot now."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        with metrics.span('session_checkpoint_seconds'):
+            rows = [(token, FORMAT_VERSION, dump(snapshot), ts) for token, (snapshot, ts) in pending.items()]
+            conn = self.pool.acquire()
+            try:
+                conn.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)", rows)
+                conn.commit()
+            except Exception:
+                with self._lock:
+                    for token, value in pending.items():
+                        self._pending.setdefault(token, value)  # keep for the next try unless superseded
+                raise
+            finally:
+                self.pool.release(conn)
+        metrics.count('session_checkpoints_total', len(rows))
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="session-checkpoints", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(EVICT_EVERY_S)
+            self._wake.clear()
+            try:
+                self.flush()
+                if time.monotonic() - self._last_evict > EVICT_EVERY_S:
+                    self.evict()
+            except Exception:
+                # why: a failed checkpoint must not kill the thread; the next turn retries
+                log.exception("Writing session checkpoints failed")
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path: str = None) -> SessionStore:
+    path = path or SESSIONS_DB
+    store = _stores.get(path)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(path)
+            if store is None:
+                store = _stores[path] = SessionStore(path)
+    return store
+
+
+@atexit.register
+def _flush_all():
+    for store in list(_stores.values()):
+        try:
+            store.flush()
+        except Exception:
+            log.exception("Writing session checkpoints at exit failed")
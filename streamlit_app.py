@@ -2,16 +2,30 @@
 """
 Restaurant Booking Chatbot (Streamlit)
 - Colab-free version (no pyngrok/google.colab)
-- Uses a local SQLite DB at data/reservations.db (ephemeral on free hosts)
-- Includes download via st.download_button
+- Uses a local SQLite DB at data/reservations.db (ephemeral on free hosts),
+  or one DB per restaurant when RESTAURANT_VENUES lists several (venues.py)
+- DB access goes through the pooled WAL connections in db.py
+- Conversation logic lives in the headless dialog.py state machine
+- Conversations are checkpointed (session_store.py) and resume from ?session=<token>
+- Includes on-demand CSV/JSONL/Parquet/SQLite export via st.download_button
+- With RESTAURANT_METRICS=1, times each section and shows a sidebar metrics panel
 """
 
 import streamlit as st
 import datetime
-import re
-import sqlite3
+import html
 import os
-from datetime import time, timedelta
+from datetime import time
+
+import archive
+import metrics
+import notifier
+import ratelimit
+import session_store
+import venues
+from db import get_reservations_page, get_write_version, search_reservations
+from dialog import BookingDialog, DialogState
+from export import FORMATS as EXPORT_FORMATS, export as export_reservations
 
 # Set the page title and favicon
 st.set_page_config(
@@ -21,454 +35,132 @@ st.set_page_config(
 )
 
 # Custom CSS for nicer UI
-st.markdown(
-    """
-    <style>
-    :root {
-        --bg: var(--background-color);
-        --text: var(--text-color);
-        --card: var(--secondary-background-color);
-        --primary: var(--primary-color);
-    }
-
-    /* App background & spacing (theme-aware) */
-    .stApp {
-        background-color: var(--bg);
-        padding: 20px;
-    }
-
-    /* Header (use theme vars so it works in dark & light) */
-    h1 {
-        color: var(--text);
-        font-family: 'Helvetica Neue', sans-serif;
-        font-weight: bold;
-        padding-bottom: 15px;
-        border-bottom: 2px solid var(--primary);
-        margin-bottom: 30px;
-    }
-
-    /* Chat bubbles (use secondary background for contrast) */
-    .stChatMessage[data-testid="user-stChatMessage"],
-    .stChatMessage[data-testid="assistant-stChatMessage"] {
-        background-color: var(--card);
-        border: 1px solid rgba(0,0,0,0.15);
-        border-radius: 12px;
-        padding: 12px;
-        margin: 10px 0;
-        color: var(--text);
-    }
-    .stChatMessage[data-testid="user-stChatMessage"] {
-        border-left: 4px solid var(--primary);
-    }
-
-    /* Buttons (no hardcoded colors; respect theme) */
-    .stButton>button {
-        border-radius: 20px;
-        font-weight: bold;
-        box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-        transition: transform 0.2s ease;
-    }
-    .stButton>button:hover { transform: translateY(-1px); }
-    </style>
-    """,
-    unsafe_allow_html=True,
-)
-
-# ---------- Utilities ----------
-
-def ensure_db():
-    """Create 'data' dir and reservations table if not present."""
-    os.makedirs('data', exist_ok=True)
-    conn = sqlite3.connect('data/reservations.db')
-    c = conn.cursor()
-    c.execute(
-        """
-        CREATE TABLE IF NOT EXISTS reservations (
-            id INTEGER PRIMARY KEY,
-            name TEXT,
-            guests INTEGER,
-            date TEXT,
-            time TEXT,
-            email TEXT,
-            phone TEXT,
-            special_requests TEXT
-        )
+with metrics.span('ui_section_seconds', section='css'):
+    st.markdown(
         """
-    )
-    conn.commit()
-    conn.close()
+        <style>
+        :root {
+            --bg: var(--background-color);
+            --text: var(--text-color);
+            --card: var(--secondary-background-color);
+            --primary: var(--primary-color);
+        }
 
-# Database operations
+        /* App background & spacing (theme-aware) */
+        .stApp {
+            background-color: var(--bg);
+            padding: 20px;
+        }
 
-def get_next_reservation_id():
-    conn = sqlite3.connect('data/reservations.db')
-    c = conn.cursor()
-    c.execute("SELECT MAX(id) FROM reservations")
-    max_id = c.fetchone()[0]
-    conn.close()
-    return 1 if max_id is None else max_id + 1
+        /* Header (use theme vars so it works in dark & light) */
+        h1 {
+            color: var(--text);
+            font-family: 'Helvetica Neue', sans-serif;
+            font-weight: bold;
+            padding-bottom: 15px;
+            border-bottom: 2px solid var(--primary);
+            margin-bottom: 30px;
+        }
 
+        /* Chat bubbles (use secondary background for contrast) */
+        .stChatMessage[data-testid="user-stChatMessage"],
+        .stChatMessage[data-testid="assistant-stChatMessage"] {
+            background-color: var(--card);
+            border: 1px solid rgba(0,0,0,0.15);
+            border-radius: 12px;
+            padding: 12px;
+            margin: 10px 0;
+            color: var(--text);
+        }
+        .stChatMessage[data-testid="user-stChatMessage"] {
+            border-left: 4px solid var(--primary);
+        }
 
-def save_reservation(reservation_data):
-    conn = sqlite3.connect('data/reservations.db')
-    c = conn.cursor()
-    c.execute(
-        """
-        INSERT INTO reservations (id, name, guests, date, time, email, phone, special_requests)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        /* Buttons (no hardcoded colors; respect theme) */
+        .stButton>button {
+            border-radius: 20px;
+            font-weight: bold;
+            box-shadow: 0 2px 5px rgba(0,0,0,0.1);
+            transition: transform 0.2s ease;
+        }
+        .stButton>button:hover { transform: translateY(-1px); }
+        </style>
         """,
-        (
-            reservation_data['id'],
-            reservation_data['name'],
-            reservation_data['guests'],
-            reservation_data['date'],
-            reservation_data['time'],
-            reservation_data['email'],
-            reservation_data['phone'],
-            reservation_data.get('special_requests', '')
-        )
+        unsafe_allow_html=True,
     )
-    conn.commit()
-    conn.close()
-
-
-def get_all_reservations():
-    conn = sqlite3.connect('data/reservations.db')
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM reservations ORDER BY date, time")
-    result = [dict(row) for row in c.fetchall()]
-    conn.close()
-    return result
-
-
-def update_reservation(reservation):
-    conn = sqlite3.connect('data/reservations.db')
-    c = conn.cursor()
-    c.execute(
-        "UPDATE reservations SET name=?, guests=?, date=?, time=?, email=?, phone=?, special_requests=? WHERE id=?",
-        (
-            reservation['name'],
-            reservation['guests'],
-            reservation['date'],
-            reservation['time'],
-            reservation['email'],
-            reservation['phone'],
-            reservation.get('special_requests', ''),
-            reservation['id'],
-        ),
-    )
-    conn.commit()
-    conn.close()
-
 
-def delete_reservation(reservation_id):
-    conn = sqlite3.connect('data/reservations.db')
-    c = conn.cursor()
-    c.execute("DELETE FROM reservations WHERE id=?", (reservation_id,))
-    conn.commit()
-    conn.close()
+# ---------- Background maintenance ----------
 
+@st.cache_resource
+def start_maintenance():
+    # why: cache_resource makes this once per server process, not once per rerun
+    notifier.start_worker()
+    return archive.start_scheduler(job=venues.maintain_all)
 
-# ---------- Validation Helpers ----------
 
-def is_valid_email(email: str) -> bool:
-    return re.match(r"^[\w\.-]+@[\w\.-]+\.[a-zA-Z]{2,}$", email) is not None
+start_maintenance()
 
+# ---------- Venue ----------
 
-def is_valid_phone(phone: str) -> bool:
-    return re.match(r"^[+\d][\d\s()-]{6,}$", phone) is not None
-
+slug = st.query_params.get('venue')
+venue = venues.get_venue(slug if slug in venues.VENUES else None)
+if len(venues.VENUES) > 1:
+    slugs = list(venues.VENUES)
+    venue = venues.get_venue(st.sidebar.selectbox(
+        "Restaurant", slugs, index=slugs.index(venue.slug), format_func=lambda slug: venues.VENUES[slug].name
+    ))
+    st.query_params['venue'] = venue.slug
 
 # ---------- Chat State ----------
 
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
-
-if 'reservation_data' not in st.session_state:
-    st.session_state.reservation_data = {}
+# why: the conversation logic lives in dialog.py; this script only adapts it to Streamlit
+dialog = BookingDialog(opening=venue.opening, closing=venue.closing)
 
-if 'current_step' not in st.session_state:
-    st.session_state.current_step = 'greeting'
+sessions = session_store.get_store()
 
-if 'editing_id' not in st.session_state:
-    st.session_state.editing_id = None
+if 'dialog_state' not in st.session_state:
+    # why: a redeploy or a move to another replica starts a fresh Streamlit session; resume from the URL token
+    token = st.query_params.get('session')
+    restored = sessions.load(token) if token else None
+    if restored is None:
+        token = session_store.new_token()
+    st.session_state.session_token = token
+    st.session_state.dialog_state = restored or DialogState()
+    st.query_params['session'] = token
+    st.session_state.venue_slug = venue.slug
 
+chat = st.session_state.dialog_state
 
-# ---------- Chat Flow ----------
+HISTORY_PAGE = 20  # messages rendered per "Show earlier" step
 
-def add_message(role: str, content: str):
-    st.session_state.messages.append({"role": role, "content": content})
+if 'history_window' not in st.session_state:
+    st.session_state.history_window = HISTORY_PAGE
 
 
 def reset_chat():
-    st.session_state.messages = []
-    st.session_state.reservation_data = {}
-    st.session_state.current_step = 'greeting'
-    st.session_state.editing_id = None
+    chat.reset()
+    st.session_state.history_window = HISTORY_PAGE
+    sessions.checkpoint(st.session_state.session_token, chat)
 
 
-def process_input(user_input: str):
-    user_input = user_input.strip()
-    if not user_input:
-        return
+if st.session_state.venue_slug != venue.slug:
+    # a booking in progress belongs to the restaurant it was started at
+    st.session_state.venue_slug = venue.slug
+    st.session_state.viewer_cursors = [None]
+    st.session_state.pop('export_path', None)
+    reset_chat()
 
-    add_message("user", user_input)
-
-    # Simple intent detection
-    text = user_input.lower()
-    intents = {
-        'book': any(k in text for k in ["book", "reserve", "reservation", "table"]),
-        'manage': any(k in text for k in ["manage", "update", "change", "edit", "cancel"]),
-        'help': any(k in text for k in ["help", "how", "instructions"]),
-    }
-
-    if st.session_state.current_step == 'greeting':
-        add_message(
-            "assistant",
-            "Hello! I'm your booking assistant. Would you like to **book a table** or **manage reservations**?",
-        )
-        st.session_state.current_step = 'await_intent'
-        return
 
-    if st.session_state.current_step == 'await_intent':
-        if intents['book']:
-            st.session_state.reservation_data = {}
-            add_message("assistant", "Great! How many people?")
-            st.session_state.current_step = 'guests'
-        elif intents['manage']:
-            add_message("assistant", "Please enter your reservation ID to manage it.")
-            st.session_state.current_step = 'manage_id'
-        else:
-            add_message("assistant", "Please say **book** or **manage**.")
+def process_input(user_input: str):
+    # why: a flood of messages or button clicks stops here, before any dialog or database work
+    client = ratelimit.client_address(st.context.headers, st.context.ip_address)
+    wait = ratelimit.check(st.session_state.session_token, client)
+    if wait:
+        st.toast(f"Too many messages. Please wait {wait:.0f}s and try again.")
         return
-
-    # Booking steps
-    if st.session_state.current_step == 'guests':
-        try:
-            guests = int(re.findall(r"\d+", user_input)[0])
-            st.session_state.reservation_data['guests'] = max(1, min(20, guests))
-            add_message("assistant", "Select the **date** for your reservation.")
-            st.session_state.current_step = 'date'
-        except Exception:
-            add_message("assistant", "Please provide a valid number of guests (e.g., 2, 4, 6).")
-
-    elif st.session_state.current_step == 'date':
-        # Handled via date picker; we still accept textual YYYY-MM-DD.
-        try:
-            datetime.date.fromisoformat(user_input[:10])
-            st.session_state.reservation_data['date'] = user_input[:10]
-            add_message("assistant", "Now choose a **time** (e.g., 19:30).")
-            st.session_state.current_step = 'time'
-        except Exception:
-            add_message("assistant", "Use the date picker or type as YYYY-MM-DD.")
-
-    elif st.session_state.current_step == 'time':
-        try:
-            hh, mm = [int(x) for x in user_input.split(":")]
-            t = time(hh, mm)
-            # simple opening hours guard
-            open_t, close_t = time(11, 0), time(22, 0)
-            if not (open_t <= t <= close_t):
-                add_message("assistant", "We are open 11:00–22:00. Pick a time within hours.")
-                return
-            st.session_state.reservation_data['time'] = f"{hh:02d}:{mm:02d}"
-            add_message("assistant", "What's your **name**?")
-            st.session_state.current_step = 'name'
-        except Exception:
-            add_message("assistant", "Please type time like HH:MM (e.g., 18:45).")
-
-    elif st.session_state.current_step == 'name':
-        st.session_state.reservation_data['name'] = user_input.title()
-        add_message("assistant", "Your **email**?")
-        st.session_state.current_step = 'email'
-
-    elif st.session_state.current_step == 'email':
-        if is_valid_email(user_input):
-            st.session_state.reservation_data['email'] = user_input
-            add_message("assistant", "Your **phone number**?")
-            st.session_state.current_step = 'phone'
-        else:
-            add_message("assistant", "That email looks invalid. Try again.")
-
-    elif st.session_state.current_step == 'phone':
-        if is_valid_phone(user_input):
-            st.session_state.reservation_data['phone'] = user_input
-            add_message("assistant", "Any **special requests**? If none, say 'no'.")
-            st.session_state.current_step = 'special'
-        else:
-            add_message("assistant", "Please provide a valid phone number.")
-
-    elif st.session_state.current_step == 'special':
-        if user_input.lower() not in ("no", "none", "n/a"):
-            st.session_state.reservation_data['special_requests'] = user_input
-        else:
-            st.session_state.reservation_data['special_requests'] = ""
-
-        # Summarize & confirm
-        r = st.session_state.reservation_data
-        add_message(
-            "assistant",
-            (
-                f"Please confirm:\n\n"
-                f"• Name: {r['name']}\n"
-                f"• Guests: {r['guests']}\n"
-                f"• Date: {r['date']}\n"
-                f"• Time: {r['time']}\n"
-                f"• Email: {r['email']}\n"
-                f"• Phone: {r['phone']}\n"
-                f"• Special: {r.get('special_requests','')}\n\n"
-                "Type **confirm** to save or **edit** to make changes."
-            ),
-        )
-        st.session_state.current_step = 'confirm'
-
-    elif st.session_state.current_step == 'confirm':
-        if user_input.lower().strip() == 'confirm':
-            ensure_db()
-            new_id = get_next_reservation_id()
-            st.session_state.reservation_data['id'] = new_id
-            save_reservation(st.session_state.reservation_data)
-            add_message("assistant", f"✅ Reservation saved! Your ID is **{new_id}**. Need anything else?")
-            st.session_state.current_step = 'post_confirmation'
-        elif user_input.lower().strip() == 'edit':
-            add_message("assistant", "What would you like to change? (guests, date, time, name, email, phone, special)")
-            st.session_state.current_step = 'correction'
-        else:
-            add_message("assistant", "Please type **confirm** or **edit**.")
-
-    elif st.session_state.current_step == 'correction':
-        field = user_input.lower()
-        mapping = {
-            'guests': 'guests',
-            'people': 'guests',
-            'party': 'guests',
-            'date': 'date',
-            'day': 'date',
-            'time': 'time',
-            'hour': 'time',
-            'name': 'name',
-            'email': 'email',
-            'phone': 'phone',
-            'number': 'phone',
-            'special': 'special_requests',
-            'requests': 'special_requests',
-        }
-        key = mapping.get(field)
-        if not key:
-            add_message("assistant", "Specify one of: guests, date, time, name, email, phone, special.")
-            return
-        st.session_state.reservation_data.pop(key, None)
-        add_message("assistant", f"Okay, please provide new value for **{key}**.")
-        st.session_state.current_step = key
-
-    # Editing individual fields after correction intent
-    elif st.session_state.current_step == 'guests' and 'guests' not in st.session_state.reservation_data:
-        try:
-            guests = int(re.findall(r"\d+", user_input)[0])
-            st.session_state.reservation_data['guests'] = max(1, min(20, guests))
-            add_message("assistant", "Continue: type **confirm** to save or edit another field.")
-            st.session_state.current_step = 'confirm'
-        except Exception:
-            add_message("assistant", "Please provide a valid number of guests (e.g., 2, 4, 6).")
-
-    elif st.session_state.current_step == 'date' and 'date' not in st.session_state.reservation_data:
-        try:
-            datetime.date.fromisoformat(user_input[:10])
-            st.session_state.reservation_data['date'] = user_input[:10]
-            add_message("assistant", "Continue: type **confirm** to save or edit another field.")
-            st.session_state.current_step = 'confirm'
-        except Exception:
-            add_message("assistant", "Use the date picker or type as YYYY-MM-DD.")
-
-    elif st.session_state.current_step == 'time' and 'time' not in st.session_state.reservation_data:
-        try:
-            hh, mm = [int(x) for x in user_input.split(":")]
-            t = time(hh, mm)
-            open_t, close_t = time(11, 0), time(22, 0)
-            if not (open_t <= t <= close_t):
-                add_message("assistant", "We are open 11:00–22:00. Pick a time within hours.")
-                return
-            st.session_state.reservation_data['time'] = f"{hh:02d}:{mm:02d}"
-            add_message("assistant", "Continue: type **confirm** to save or edit another field.")
-            st.session_state.current_step = 'confirm'
-        except Exception:
-            add_message("assistant", "Please type time like HH:MM (e.g., 18:45).")
-
-    elif st.session_state.current_step == 'name' and 'name' not in st.session_state.reservation_data:
-        st.session_state.reservation_data['name'] = user_input.title()
-        add_message("assistant", "Continue: type **confirm** to save or edit another field.")
-        st.session_state.current_step = 'confirm'
-
-    elif st.session_state.current_step == 'email' and 'email' not in st.session_state.reservation_data:
-        if is_valid_email(user_input):
-            st.session_state.reservation_data['email'] = user_input
-            add_message("assistant", "Continue: type **confirm** to save or edit another field.")
-            st.session_state.current_step = 'confirm'
-        else:
-            add_message("assistant", "That email looks invalid. Try again.")
-
-    elif st.session_state.current_step == 'phone' and 'phone' not in st.session_state.reservation_data:
-        if is_valid_phone(user_input):
-            st.session_state.reservation_data['phone'] = user_input
-            add_message("assistant", "Continue: type **confirm** to save or edit another field.")
-            st.session_state.current_step = 'confirm'
-        else:
-            add_message("assistant", "Please provide a valid phone number.")
-
-    elif st.session_state.current_step == 'special_requests' and 'special_requests' not in st.session_state.reservation_data:
-        st.session_state.reservation_data['special_requests'] = user_input
-        add_message("assistant", "Continue: type **confirm** to save or edit another field.")
-        st.session_state.current_step = 'confirm'
-
-    # Manage reservation path
-    elif st.session_state.current_step == 'manage_id':
-        try:
-            rid = int(re.findall(r"\d+", user_input)[0])
-            st.session_state.editing_id = rid
-            ensure_db()
-            rows = [r for r in get_all_reservations() if r['id'] == rid]
-            if not rows:
-                add_message("assistant", f"I couldn't find reservation ID {rid}. Try again.")
-            else:
-                r = rows[0]
-                add_message(
-                    "assistant",
-                    (
-                        "Found it! What would you like to do?\n"
-                        "• Type **update** to edit fields\n"
-                        "• Type **cancel** to delete\n"
-                        "• Type **show** to display details"
-                    ),
-                )
-                st.session_state.current_step = 'manage_action'
-        except Exception:
-            add_message("assistant", "Please enter a valid numeric reservation ID.")
-
-    elif st.session_state.current_step == 'manage_action':
-        act = user_input.lower()
-        if act == 'cancel':
-            delete_reservation(st.session_state.editing_id)
-            add_message("assistant", "Reservation cancelled.")
-            st.session_state.current_step = 'greeting'
-        elif act == 'show':
-            rows = [r for r in get_all_reservations() if r['id'] == st.session_state.editing_id]
-            if rows:
-                r = rows[0]
-                add_message(
-                    "assistant",
-                    (
-                        f"Reservation **{r['id']}**: {r['name']}, {r['guests']} guests, {r['date']} {r['time']}, "
-                        f"{r['email']}, {r['phone']}, Special: {r.get('special_requests','')}"
-                    ),
-                )
-            else:
-                add_message("assistant", "Reservation not found anymore.")
-        elif act == 'update':
-            add_message("assistant", "Which field to update? (guests, date, time, name, email, phone, special)")
-            st.session_state.current_step = 'correction'
-        else:
-            add_message("assistant", "Please type one of: update, cancel, show.")
+    with metrics.span('ui_section_seconds', section='process_input'), venues.activate(venue):
+        dialog.handle(chat, user_input)
+        sessions.checkpoint(st.session_state.session_token, chat)
 
 
 # ---------- UI ----------
@@ -480,33 +172,89 @@ with st.expander("How it works", expanded=True):
         "Use the chat below to book or manage a reservation. You can also use the sidebar to quick-fill date/time.")
 
 # Sidebar quick inputs (optional UX sugar)
-with st.sidebar:
+with st.sidebar, metrics.span('ui_section_seconds', section='sidebar'):
     st.header("Quick Inputs")
     today = datetime.date.today()
     date_pick = st.date_input("Date", value=today)
     time_pick = st.time_input("Time", value=time(19, 0))
     if st.button("Use date/time"):
         # why: enable mouse-only users to fill fields quickly
-        if st.session_state.current_step in {"date", "time"}:
-            if st.session_state.current_step == 'date':
+        if chat.current_step in {"date", "time"}:
+            if chat.current_step == 'date':
                 process_input(date_pick.isoformat())
             else:
                 process_input(time_pick.strftime("%H:%M"))
             st.rerun()
 
 # Existing reservations viewer
-with st.expander("All Reservations"):
-    ensure_db()
-    rows = get_all_reservations()
+PAGE_SIZE = 25
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def load_reservations_page(venue_slug, write_version, after, date_from, date_to, name):
+    # why: write_version is part of the cache key, so pages are reused until a write lands
+    return get_reservations_page(after=after, limit=PAGE_SIZE + 1, date_from=date_from, date_to=date_to, name=name)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def load_search_results(venue_slug, write_version, query, date_from, date_to):
+    return search_reservations(query, limit=PAGE_SIZE, date_from=date_from, date_to=date_to)
+
+
+if 'viewer_cursors' not in st.session_state:
+    st.session_state.viewer_cursors = [None]
+
+
+def reset_viewer_page():
+    st.session_state.viewer_cursors = [None]
+
+
+with st.expander("All Reservations"), venues.activate(venue), metrics.span('ui_section_seconds', section='viewer'):
+    f1, f2 = st.columns(2)
+    date_range = f1.date_input("Date range", value=(), key="viewer_dates", on_change=reset_viewer_page)
+    query = f2.text_input("Search name, email or phone", key="viewer_query", on_change=reset_viewer_page).strip()
+    date_from = date_range[0].isoformat() if len(date_range) > 0 else None
+    date_to = date_range[1].isoformat() if len(date_range) > 1 else None
+
+    cursors = st.session_state.viewer_cursors
+    if query:
+        # ranked matches, best first; one page is enough to pick a booking
+        rows = load_search_results(venue.slug, get_write_version(), query, date_from, date_to)
+        has_next = False
+    else:
+        rows = load_reservations_page(venue.slug, get_write_version(), cursors[-1], date_from, date_to, None)
+        has_next = len(rows) > PAGE_SIZE
+        rows = rows[:PAGE_SIZE]
     if rows:
         st.table(rows)
-    else:
-        st.info("No reservations yet.")
+    elif len(cursors) == 1:
+        st.info("No reservations yet." if not (date_from or query) else "No reservations match.")
 
-# Render messages
-for msg in st.session_state.messages:
-    with st.chat_message(msg["role"]):
-        st.markdown(msg["content"])  # why: use markdown for bold/lines
+    p1, p2, p3 = st.columns([1, 1, 2])
+    if p1.button("Previous", key="viewer_prev", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if p2.button("Next", key="viewer_next", disabled=not has_next):
+        last = rows[-1]
+        cursors.append((last['date'], last['time'], last['id']))
+        st.rerun()
+    p3.caption(f"Page {len(cursors)}")
+
+# Render messages (only the newest window; older ones behind "Show earlier")
+with metrics.span('ui_section_seconds', section='messages'):
+    visible, hidden = chat.messages.window(st.session_state.history_window)
+    if hidden or chat.messages.dropped:
+        h1, h2 = st.columns([3, 1])
+        note = f"{hidden} earlier messages hidden." if hidden else ""
+        if chat.messages.dropped:
+            note += f" {chat.messages.dropped} oldest messages no longer kept."
+        h1.caption(note.strip())
+        if hidden and h2.button("Show earlier", key="history_more"):
+            st.session_state.history_window += HISTORY_PAGE
+            st.rerun()
+    for role, content in visible:
+        with st.chat_message(role):
+            st.markdown(content)  # why: use markdown for bold/lines
 
 # Quick action buttons
 with st.container():
@@ -529,35 +277,75 @@ if st.button("Reset Chat"):
     reset_chat()
     st.rerun()
 
-# Download the database
-try:
-    with open('data/reservations.db', 'rb') as f:
-        db_bytes = f.read()
-    st.download_button(
-        label="Download Database",
-        data=db_bytes,
-        file_name="reservations.db",
-        mime="application/octet-stream",
-        help="Download the current SQLite database"
+# Export the database (generated on demand, cached until the next write)
+EXPORT_LABELS = {
+    'csv': "CSV",
+    'jsonl': "JSON Lines",
+    'parquet': "Parquet",
+    'sqlite': "SQLite database",
+}
+
+
+def clear_export():
+    st.session_state.pop('export_path', None)
+
+
+with st.expander("Export Reservations"), venues.activate(venue), metrics.span('ui_section_seconds', section='export'):
+    fmt = st.selectbox(
+        "Format", list(EXPORT_LABELS), format_func=EXPORT_LABELS.get, key="export_format", on_change=clear_export
     )
-except FileNotFoundError:
-    st.info("No database found yet. Create a reservation first.")
-except Exception as e:
-    st.error(f"Error preparing database download: {e}")
+    if st.button("Prepare export", help="Snapshot the current reservations"):
+        try:
+            st.session_state.export_path = export_reservations(fmt)
+        except Exception as e:
+            st.error(f"Error preparing export: {e}")
+    path = st.session_state.get('export_path')
+    if path and os.path.exists(path):
+        with open(path, 'rb') as f:
+            st.download_button(
+                label=f"Download {EXPORT_LABELS[fmt]}",
+                data=f,
+                file_name=os.path.basename(path),
+                mime=EXPORT_FORMATS[fmt][1],
+                on_click=clear_export,
+            )
 
 # Footer
-st.markdown("---")
-st.markdown(
-    """
-    <div style="text-align: center; color: #888; padding: 20px 0;">
-        <p><strong>Fine Dining Restaurant</strong></p>
-        <p>123 Gourmet Avenue, Foodie District</p>
-        <p>Opening Hours: 11:00 AM - 10:00 PM, 7 days a week</p>
-        <p>For special events and large parties, please call us directly at (555) 123-4567</p>
-        <small>Powered by Streamlit Chatbot</small>
-    </div>
-    """,
-
-    unsafe_allow_html=True,
-)
+with metrics.span('ui_section_seconds', section='footer'):
+    st.markdown("---")
+    st.markdown(
+        f"""
+        <div style="text-align: center; color: #888; padding: 20px 0;">
+            <p><strong>{html.escape(venue.name)}</strong></p>
+            <p>{html.escape(venue.address)}</p>
+            <p>Opening Hours: {venue.opening:%I:%M %p} - {venue.closing:%I:%M %p}, {html.escape(venue.days)}</p>
+            <p>For special events and large parties, please call us directly at {html.escape(venue.phone)}</p>
+            <small>Powered by Streamlit Chatbot</small>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+# Metrics (RESTAURANT_METRICS=1): local /metrics endpoint, textfile export and an admin panel
+METRICS_PORT = os.environ.get('RESTAURANT_METRICS_PORT')
+METRICS_FILE = os.environ.get('RESTAURANT_METRICS_FILE')
+
 
+@st.cache_resource
+def start_metrics_server(port: int):
+    # why: cache_resource runs this once per process, not once per rerun
+    return metrics.start_http_server(port)
+
+
+if metrics.ENABLED:
+    if METRICS_PORT:
+        start_metrics_server(int(METRICS_PORT))
+    if METRICS_FILE:
+        metrics.write_textfile(METRICS_FILE, min_interval=10)
+    with st.sidebar.expander("Performance"):
+        st.dataframe(metrics.snapshot(), hide_index=True)
+        m1, m2 = st.columns(2)
+        m1.download_button("metrics.prom", metrics.render_prometheus(), file_name="metrics.prom", mime="text/plain")
+        if m2.button("Reset", key="metrics_reset"):
+            metrics.reset()
+            st.rerun()
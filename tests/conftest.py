@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import capacity  # noqa: E402
+import db  # noqa: E402
+
+
+@pytest.fixture
+def database(tmp_path):
+    """A fresh reservations database on the default floor plan, for this test only."""
+    with capacity.use_config(capacity.CapacityConfig()), db.use_database(str(tmp_path / "reservations.db")):
+        db.ensure_db()
+        yield
+    db.close_all()
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+import api
+import db
+
+BODY = {
+    'name': "Ann", 'guests': 2, 'date': "2030-01-01", 'time': "19:00",
+    'email': "ann@example.com", 'phone': "+1 555 0100",
+}
+
+
+def test_idempotent_replay_returns_the_stored_booking(database):
+    status, first = api.create_reservation(BODY, "key-1")
+    assert status == 201
+    status, again = api.create_reservation(dict(BODY), "key-1")
+    assert (status, again) == (201, first)
+
+
+def test_idempotency_key_reused_with_another_body_is_refused(database):
+    api.create_reservation(BODY, "key-1")
+    with pytest.raises(api.ApiError) as e:
+        api.create_reservation({**BODY, 'guests': 4}, "key-1")
+    assert e.value.status == 422
+
+
+def test_patch_returns_the_booking_as_stored(database):
+    _, created = api.create_reservation(BODY, None)
+    status, patched = api.patch_reservation(created['id'], {'guests': 3})
+    assert status == 200
+    assert patched['guests'] == 3
+    assert patched['seating'] == "4"
+    assert patched == db.get_reservation(created['id'])
+
+
+async def raw_request(data: bytes) -> bytes:
+    server = await asyncio.start_server(api.BookingApi(workers=1).handle_connection, '127.0.0.1', 0)
+    async with server:
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        writer.write(data)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        return response
+
+
+@pytest.mark.parametrize('length', [b'abc', b'-1', b'1_0'])
+def test_bad_content_length_is_a_400(length):
+    response = asyncio.run(raw_request(b"POST /reservations HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n"))
+    assert response.startswith(b"HTTP/1.1 400 ")
+    assert b"Invalid Content-Length" in response
@@ -0,0 +1,49 @@
+import pytest
+
+import api
+import archive
+import db
+from dialog import BookingDialog, DialogState
+
+PAST = {
+    'name': "Ann", 'guests': 2, 'date': "2020-01-01", 'time': "19:00",
+    'email': "ann@example.com", 'phone': "5551234567", 'special_requests': "",
+}
+UPCOMING = {**PAST, 'date': "2030-01-01"}
+
+
+def test_past_bookings_move_to_the_archive(database):
+    old, new = db.save_reservation(PAST), db.save_reservation(UPCOMING)
+    assert archive.archive_before("2025-01-01") == 1
+    assert archive.archive_before("2025-01-01") == 0
+    with db.connection() as conn:
+        assert [row[0] for row in conn.execute("SELECT id FROM reservations")] == [new]
+        assert conn.execute("SELECT count(*) FROM occupancy WHERE date < '2025-01-01'").fetchone()[0] == 0
+    # read-through: the old ID still resolves, flagged as archived
+    assert db.get_reservation(old)['archived']
+    assert not db.get_reservation(new).get('archived')
+    assert db.get_reservation(old, include_archived=False) is None
+
+
+def test_maintenance_runs_at_most_once_per_interval(database):
+    db.save_reservation(PAST)
+    assert archive.maintain(days=30, interval_hours=1) == 1
+    assert archive.maintain(days=30, interval_hours=1) == -1
+
+
+def test_archived_bookings_cannot_be_changed(database):
+    rid = db.save_reservation(PAST)
+    archive.archive_before("2025-01-01")
+    assert not db.update_reservation({**PAST, 'id': rid, 'guests': 4})
+    assert not db.delete_reservation(rid)
+    for call in (lambda: api.patch_reservation(rid, {'guests': 4}), lambda: api.cancel_reservation(rid)):
+        with pytest.raises(api.ApiError) as e:
+            call()
+        assert e.value.status == 409
+
+    dialog, state = BookingDialog(), DialogState()
+    state.current_step = 'manage_id'
+    dialog.handle(state, str(rid))
+    assert state.editing_id is None
+    assert "can no longer be changed" in state.messages[-1].content
+    assert db.get_reservation(rid)['guests'] == 2
@@ -0,0 +1,86 @@
+import datetime
+
+import pytest
+
+import capacity
+import db
+import venues
+
+DATE = (datetime.date.today() + datetime.timedelta(days=7)).isoformat()
+
+
+def booking(n: int, guests: int, time: str = "19:00") -> dict:
+    return {
+        'name': f"Guest {n}", 'guests': guests, 'date': DATE, 'time': time,
+        'email': f"guest{n}@example.com", 'phone': "555-0100",
+    }
+
+
+def book_all(parties) -> list:
+    """Save each (n, guests) party at 19:00; returns the IDs, or None where it was turned away."""
+    saved = []
+    for n, guests in parties:
+        try:
+            saved.append(db.save_reservation(booking(n, guests)))
+        except capacity.FullyBooked:
+            saved.append(None)
+    return saved
+
+
+def seatings(ids) -> list:
+    return sorted(db.get_reservation(i)['seating'] for i in ids if i is not None)
+
+
+def test_parties_of_three_never_sit_at_two_tops_alone(database):
+    # default floor 2x6,4x8,6x3: eight 4-tops, three 6-tops, then three pairs of 2-tops
+    saved = book_all((n, 3) for n in range(17))
+    assert sum(i is not None for i in saved) == 14
+    assert saved[14:] == [None, None, None]
+    assert seatings(saved) == ["2+2"] * 3 + ["4"] * 8 + ["6"] * 3
+    assert not db.is_available(DATE, "19:00", 3)
+    assert db.suggest_times(DATE, "19:00", 3, "12:00", "22:00") == ["17:15", "17:30", "20:30"]
+
+
+def test_smallest_table_that_fits_is_used_first(database):
+    saved = book_all([(0, 2), (1, 3), (2, 5), (3, 7)])
+    assert [db.get_reservation(i)['seating'] for i in saved] == ["2", "4", "6", "4+4"]
+
+
+def test_each_table_size_is_checked(database):
+    # parties of six fill the 6-tops, then sit at three 2-tops, then at two 4-tops
+    saved = book_all((n, 6) for n in range(8))
+    assert [db.get_reservation(i)['seating'] for i in saved] == ["6"] * 3 + ["2+2+2"] * 2 + ["4+4"] * 3
+    # two 4-tops are left
+    assert db.is_available(DATE, "19:00", 8)
+    assert not db.is_available(DATE, "19:00", 9)
+    assert db.suggest_times(DATE, "19:00", 9, "19:00", "19:00") == []
+
+
+def test_cancelling_frees_the_tables_it_held(database):
+    saved = book_all((n, 3) for n in range(14))
+    assert not db.is_available(DATE, "19:00", 3)
+    db.delete_reservation(saved[0])
+    assert db.is_available(DATE, "19:00", 3)
+
+
+def test_parse_tables():
+    assert capacity.parse_tables("2x6, 4X8,") == ((2, 6), (4, 8))
+    with pytest.raises(ValueError):
+        capacity.parse_tables("2-6")
+
+
+def test_occupancy_is_rebuilt_when_the_tables_change(database):
+    (rid,) = book_all([(0, 3)])
+    no_four_tops = capacity.CapacityConfig(tables=((2, 6), (6, 3)))
+    with capacity.use_config(no_four_tops), db.transaction() as conn:
+        capacity.ensure_occupancy(conn)
+        sizes = {row[0] for row in conn.execute("SELECT seats FROM occupancy WHERE tables > 0")}
+    assert sizes == {6}
+    assert db.get_reservation(rid)['seating'] == "6"
+
+
+def test_venue_tables_use_the_same_parser():
+    venue = venues.Venue.from_dict({'slug': "downtown", 'tables': "2x6, 4X8"})
+    assert venue.capacity_config.tables == capacity.parse_tables("2x6,4x8")
+    with pytest.raises(ValueError):
+        venues.Venue.from_dict({'slug': "harbour", 'tables': "2 by 6"})
@@ -0,0 +1,103 @@
+import pytest
+
+import db
+from dialog import BookingDialog, DialogState, InvalidInput
+from extract import extract_slots
+
+
+def test_guests_step_accepts_number_words():
+    dialog = BookingDialog()
+    assert dialog.parse_guests("four") == 4
+    assert dialog.parse_guests("a couple of us") == 2
+    assert dialog.parse_guests("6") == 6
+    with pytest.raises(InvalidInput):
+        dialog.parse_guests("lots")
+
+
+@pytest.mark.parametrize('text', ["twenty five", "twenty-five", "one or two"])
+def test_guests_step_asks_again_for_compound_number_words(text):
+    with pytest.raises(InvalidInput):
+        BookingDialog().parse_guests(text)
+
+
+def test_guests_step_moves_on_after_a_number_word():
+    dialog, state = BookingDialog(), DialogState()
+    for text in ("hi", "book", "four"):
+        dialog.handle(state, text)
+    assert state.reservation_data['guests'] == 4
+    assert state.current_step == 'date'
+
+
+@pytest.mark.parametrize('text', ["under the name of Smith", "under the name Smith", "my name is smith"])
+def test_name_cues(text):
+    assert extract_slots(text)['name'] == "Smith"
+
+
+BOOKING = {
+    'name': "Ann", 'guests': 2, 'date': "2030-01-01", 'time': "19:00",
+    'email': "ann@example.com", 'phone': "5551234567", 'special_requests': "",
+}
+
+
+def managing(rid: int) -> DialogState:
+    state = DialogState()
+    state.editing_id = rid
+    state.current_step = 'manage_action'
+    return state
+
+
+def test_cancelling_a_booking_that_is_gone_says_so(database):
+    rid = db.save_reservation(BOOKING)
+    dialog, state = BookingDialog(), managing(rid)
+    db.delete_reservation(rid)
+    dialog.handle(state, "cancel")
+    assert "not found" in state.messages[-1].content
+
+
+def test_confirming_an_edit_of_a_booking_that_is_gone_says_so(database):
+    rid = db.save_reservation(BOOKING)
+    dialog, state = BookingDialog(), managing(rid)
+    state.reservation_data = {**BOOKING, 'guests': 3}
+    state.current_step = 'confirm'
+    db.delete_reservation(rid)
+    dialog.handle(state, "confirm")
+    assert "not found" in state.messages[-1].content
+    assert "updated" not in state.messages[-1].content
+
+
+def asking_for_id() -> DialogState:
+    state = DialogState()
+    state.current_step = 'manage_id'
+    return state
+
+
+def test_an_unknown_id_never_opens_a_booking_by_phone(database):
+    db.save_reservation({**BOOKING, 'phone': "5552123456"})
+    assert db.get_reservation(12) is None
+    dialog, state = BookingDialog(), asking_for_id()
+    dialog.handle(state, "12")
+    assert state.editing_id is None
+    assert "couldn't find reservation ID" in state.messages[-1].content
+
+
+@pytest.mark.parametrize('text', ["my id is {}", "reservation {} please", "#{}"])
+def test_ids_are_found_in_common_wordings(database, text):
+    rid = db.save_reservation(BOOKING)
+    dialog, state = BookingDialog(), asking_for_id()
+    dialog.handle(state, text.format(rid))
+    assert state.editing_id == rid
+    assert state.current_step == 'manage_action'
+
+
+def test_a_single_search_match_needs_confirming(database):
+    rid = db.save_reservation(BOOKING)
+    dialog, state = BookingDialog(), asking_for_id()
+    dialog.handle(state, "Ann")
+    assert state.editing_id is None
+    assert state.current_step == 'manage_match'
+    assert BOOKING['email'] not in state.messages[-1].content
+    dialog.handle(state, "no")
+    assert (state.editing_id, state.current_step) == (None, 'manage_id')
+    dialog.handle(state, "Ann")
+    dialog.handle(state, "yes")
+    assert state.editing_id == rid
@@ -0,0 +1,62 @@
+import csv
+import json
+import os
+import sqlite3
+
+import pytest
+
+import archive
+import db
+import export
+
+BOOKING = {
+    'name': "Zoë", 'guests': 2, 'date': "2030-01-01", 'time': "19:00",
+    'email': "zoe@example.com", 'phone': "5551234567", 'special_requests': "window, please",
+}
+
+
+@pytest.fixture
+def bookings(database):
+    """One archived and one live booking, as export rows."""
+    old = db.save_reservation({**BOOKING, 'date': "2020-01-01", 'email': "old@example.com"})
+    archive.archive_before("2025-01-01")
+    new = db.save_reservation(BOOKING)
+    return [
+        {**BOOKING, 'id': old, 'date': "2020-01-01", 'email': "old@example.com"},
+        {**BOOKING, 'id': new},
+    ]
+
+
+def test_csv(bookings):
+    with open(export.export('csv'), newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert rows == [{k: str(r[k]) for k in export.COLUMNS} for r in bookings]
+
+
+def test_jsonl(bookings):
+    with open(export.export('jsonl'), encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f]
+    assert rows == [{k: r[k] for k in export.COLUMNS} for r in bookings]
+
+
+def test_parquet(bookings):
+    pq = pytest.importorskip('pyarrow.parquet')
+    assert pq.read_table(export.export('parquet')).to_pylist() == [{k: r[k] for k in export.COLUMNS} for r in bookings]
+
+
+def test_sqlite(bookings):
+    conn = sqlite3.connect(export.export('sqlite'))
+    try:
+        assert [row[0] for row in conn.execute("SELECT id FROM reservations")] == [bookings[1]['id']]
+        assert [row[0] for row in conn.execute("SELECT id FROM reservations_archive")] == [bookings[0]['id']]
+    finally:
+        conn.close()
+
+
+def test_artifact_is_reused_until_a_write(bookings):
+    first = export.export('csv')
+    assert export.export('csv') == first
+    db.save_reservation({**BOOKING, 'email': "new@example.com"})
+    second = export.export('csv')
+    assert second != first
+    assert os.listdir(export.export_dir()) == [os.path.basename(second)]  # the stale one is pruned
@@ -0,0 +1,57 @@
+import csv
+
+import capacity
+import db
+import importer
+
+
+def booking(n: int, guests: int = 2, time: str = "19:00") -> dict:
+    return {
+        'name': f"Guest {n}", 'guests': guests, 'date': "2030-01-01", 'time': time,
+        'email': f"guest{n}@example.com", 'phone': "5551234567", 'special_requests': "",
+    }
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def stored(rid: int) -> dict:
+    r = db.get_reservation(rid)
+    return {k: r[k] for k in ('name', 'guests', 'date', 'time', 'email', 'phone', 'special_requests')}
+
+
+def test_csv_round_trip_reports_bad_and_repeated_rows(database, tmp_path):
+    rows = [booking(1), booking(2, guests=4), {**booking(3), 'email': "not an email"}, {**booking(1), 'name': "Again"}]
+    write_csv(tmp_path / "in.csv", rows)
+    report = importer.import_file(str(tmp_path / "in.csv"))
+    assert (report.rows, report.inserted, report.duplicates, report.invalid) == (4, 2, 1, 1)
+    assert [line for line, _ in report.errors] == [4]  # the header is line 1
+    assert [stored(rid) for rid in (1, 2)] == rows[:2]
+    again = importer.import_file(str(tmp_path / "in.csv"))
+    assert (again.inserted, again.duplicates) == (0, 3)
+
+
+def test_rows_that_overbook_are_refused(database):
+    rows = [booking(n, guests=6) for n in range(40)]
+    report = importer.import_rows(enumerate(rows, start=2))
+    assert report.full > 0
+    assert report.inserted + report.full == 40
+    assert report.overbooked == []
+    with db.connection() as conn:
+        assert conn.execute("SELECT count(*) FROM reservations").fetchone()[0] == report.inserted
+        assert conn.execute(
+            f"SELECT count(*) FROM occupancy WHERE {capacity.over_capacity_sql(capacity.get_config())}"
+        ).fetchone()[0] == 0
+    # the first rows in the file keep their tables; the refused ones are named by line
+    assert [line for line, _ in report.errors] == list(range(2 + report.inserted, 42))
+
+
+def test_overbooking_can_be_allowed_for_existing_bookings(database):
+    rows = [booking(n, guests=6) for n in range(40)]
+    report = importer.import_rows(enumerate(rows, start=2), allow_overbooking=True)
+    assert (report.inserted, report.full) == (40, 0)
+    assert report.overbooked == ["2030-01-01"]
@@ -0,0 +1,55 @@
+import sqlite3
+
+import db
+import migrations
+
+
+def migrate_to(conn, version: int):
+    conn.isolation_level = None  # migrations manage their own transactions
+    for step_version, step in migrations.MIGRATIONS:
+        if step_version > version:
+            break
+        conn.execute("BEGIN IMMEDIATE")
+        step(conn)
+        conn.execute(f"PRAGMA user_version = {step_version}")
+        conn.execute("COMMIT")
+
+
+def insert(conn, rid: int, email: str, guests: int):
+    conn.execute(
+        "INSERT INTO reservations (id, name, guests, date, time, email, phone, special_requests) "
+        "VALUES (?, 'Ann', ?, '2030-01-01', '19:00', ?, '5551234567', '')",
+        (rid, guests, email),
+    )
+
+
+def test_duplicates_are_quarantined_not_archived(tmp_path):
+    path = str(tmp_path / "reservations.db")
+    conn = sqlite3.connect(path)
+    migrate_to(conn, 8)
+    insert(conn, 1, "ann@example.com", 2)
+    insert(conn, 2, "bob@example.com", 4)
+    insert(conn, 3, " Ann@Example.com", 2)  # the same guest and slot, confirmed twice
+    conn.close()
+
+    with db.use_database(path):
+        assert db.get_reservation(3) is None
+        assert db.get_reservation(1)['guests'] == 2
+        assert db.daily_totals('2030-01-01', '2030-01-01') == [('2030-01-01', 2, 6)]
+        with db.connection() as c:
+            assert [tuple(r) for r in c.execute("SELECT id, duplicate_of FROM reservations_duplicates")] == [(3, 1)]
+            assert c.execute("SELECT count(*) FROM reservations_archive").fetchone()[0] == 0
+    db.close_all()
+
+
+def test_bookings_made_before_notifications_are_not_confirmed(tmp_path):
+    path = str(tmp_path / "reservations.db")
+    conn = sqlite3.connect(path)
+    migrate_to(conn, 7)
+    insert(conn, 1, "ann@example.com", 2)
+    conn.close()
+
+    with db.use_database(path), db.connection() as c:
+        rows = [tuple(r) for r in c.execute("SELECT reservation_id, kind, status FROM notifications_sent")]
+    assert rows == [(1, 'confirmation', 'skipped')]
+    db.close_all()
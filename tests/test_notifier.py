@@ -0,0 +1,39 @@
+import datetime
+
+import db
+import importer
+import notifier
+
+
+class FakeMailer:
+    sender = "reservations@localhost"
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append((msg['To'], msg['Subject']))
+
+
+def booking(email: str, days: int = 7) -> dict:
+    date = (datetime.date.today() + datetime.timedelta(days=days)).isoformat()
+    return {'name': "Ann", 'guests': 2, 'date': date, 'time': "19:00", 'email': email, 'phone': "5551234567"}
+
+
+def test_imported_bookings_are_not_confirmed(database):
+    report = importer.import_rows(enumerate([booking("imported@example.com")], start=2))
+    assert report.inserted == 1
+    db.save_reservation(booking("new@example.com"))
+
+    mailer = FakeMailer()
+    counts = notifier.send_due(mailer)
+    assert counts['confirmation'] == 1
+    assert [to for to, _ in mailer.sent] == ["new@example.com"]
+    assert notifier.send_due(mailer)['confirmation'] == 0
+
+
+def test_imported_bookings_still_get_reminders(database):
+    importer.import_rows(enumerate([booking("imported@example.com", days=0)], start=2))
+    mailer = FakeMailer()
+    now = datetime.datetime.combine(datetime.date.today(), datetime.time(9))
+    assert notifier.send_due(mailer, now=now) == {'confirmation': 0, 'reminder': 1, 'failed': 0}
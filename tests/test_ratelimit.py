@@ -0,0 +1,20 @@
+import ratelimit
+
+
+def test_client_limit_is_off_unless_configured():
+    assert ratelimit.client_address({'X-Forwarded-For': '203.0.113.7'}, '10.0.0.1', source='') is None
+
+
+def test_client_address_from_peer_or_trusted_header():
+    headers = {'X-Forwarded-For': '198.51.100.1, 203.0.113.7'}
+    assert ratelimit.client_address(headers, '10.0.0.1', source='peer') == '10.0.0.1'
+    # the first entry is whatever the client sent; the proxy appended the last
+    assert ratelimit.client_address(headers, '10.0.0.1', source='X-Forwarded-For') == '203.0.113.7'
+    assert ratelimit.client_address({}, '10.0.0.1', source='X-Forwarded-For') is None
+
+
+def test_bucket_refuses_past_burst():
+    limiter = ratelimit.TokenBucketLimiter(rate=1 / 60, burst=2)
+    assert [limiter.allow('a') for _ in range(3)] == [True, True, False]
+    assert limiter.allow('b')
+    assert limiter.retry_after('a') > 0
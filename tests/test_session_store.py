@@ -0,0 +1,57 @@
+import pytest
+
+import session_store
+from dialog import BookingDialog, DialogState
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "sessions.db")
+
+
+def mid_booking() -> DialogState:
+    dialog, state = BookingDialog(), DialogState()
+    for text in ("hi", "book", "four"):
+        dialog.handle(state, text)
+    return state
+
+
+def test_a_checkpoint_resumes_after_a_restart(path):
+    state, token = mid_booking(), session_store.new_token()
+    store = session_store.SessionStore(path)
+    store.checkpoint(token, state)
+    store.flush()
+    store.pool.close()
+
+    resumed = session_store.SessionStore(path).load(token)  # a fresh store: a restart or another replica
+    assert resumed.to_dict() == state.to_dict()
+    assert resumed.current_step == 'date'
+    BookingDialog().handle(resumed, "2030-01-01")
+    assert resumed.current_step == 'time'
+
+
+def test_the_newest_checkpoint_wins_before_and_after_writing(path):
+    store, token = session_store.SessionStore(path), session_store.new_token()
+    state = mid_booking()
+    store.checkpoint(token, DialogState())
+    store.checkpoint(token, state)
+    assert store.load(token).to_dict() == state.to_dict()  # still queued
+    store.flush()
+    assert store.load(token).to_dict() == state.to_dict()
+
+
+def test_unknown_and_expired_sessions_start_fresh(path):
+    store, token = session_store.SessionStore(path), session_store.new_token()
+    store.checkpoint(token, mid_booking())
+    store.flush()
+    assert store.load(session_store.new_token()) is None
+    expired = session_store.SessionStore(path, ttl_hours=-1)
+    assert expired.load(token) is None
+    assert expired.evict() == 1
+    assert store.load(token) is None
+
+
+def test_checkpoints_from_an_unknown_format_are_ignored():
+    blob = session_store.dump(DialogState().to_dict())
+    assert session_store.load_state(blob, session_store.FORMAT_VERSION) is not None
+    assert session_store.load_state(blob, session_store.FORMAT_VERSION + 1) is None
@@ -0,0 +1,64 @@
+import pytest
+
+import db
+import writebehind
+
+BOOKING = {
+    'name': "Ann", 'guests': 2, 'date': "2030-01-01", 'time': "19:00",
+    'email': "ann@example.com", 'phone': "5551234567",
+}
+
+
+@pytest.fixture
+def batched(database):
+    mode, window_ms = db.WRITE_MODE, db.BATCH_WINDOW_MS
+    db.configure_writes('batched', window_ms=20)
+    yield
+    db.configure_writes(mode, window_ms)
+
+
+def test_batched_writes_use_lock_retries_and_stopped_writers_are_dropped(batched):
+    rid = db.save_reservation(BOOKING)
+    (writer,) = writebehind._writers
+    assert writer.begin is db.begin_immediate
+    db.configure_writes('direct')
+    assert writebehind._writers == []
+    assert db.get_reservation(rid)['name'] == "Ann"
+
+
+def test_failed_op_rolls_back_alone(batched):
+    first = db.submit_save(BOOKING)
+    again = db.submit_save(BOOKING)  # the same guest and slot
+    other = db.submit_save({**BOOKING, 'email': "bob@example.com"})
+    assert first.result() and other.result()
+    assert isinstance(again.exception(), db.DuplicateBooking)
+
+
+class FailingPool:
+    def acquire(self):
+        raise OSError("disk gone")
+
+
+def test_a_failed_begin_fails_every_caller(database):
+    def begin(conn):
+        raise RuntimeError("database is locked")
+
+    writer = writebehind.start_writer(db.get_pool(), window_ms=20, begin=begin)
+    try:
+        futures = [writer.submit(lambda conn: 1) for _ in range(3)]
+        for future in futures:
+            with pytest.raises(RuntimeError):
+                future.result(timeout=2)
+    finally:
+        writer.stop()
+
+
+def test_a_failed_acquire_fails_the_batch_and_the_writer_keeps_running():
+    writer = writebehind.start_writer(FailingPool(), window_ms=1)
+    try:
+        with pytest.raises(OSError):
+            writer.submit(lambda conn: 1).result(timeout=2)
+        with pytest.raises(OSError):
+            writer.submit(lambda conn: 1).result(timeout=2)
+    finally:
+        writer.stop()
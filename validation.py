@@ -0,0 +1,102 @@
+"""
+Input validation shared by the chat dialog and other front ends.
+"""
+
+import datetime
+import re
+from datetime import time
+
+from capacity import get_config
+
+OPENING_TIME = time(11, 0)
+CLOSING_TIME = time(22, 0)
+
+_EMAIL_RE = re.compile(r"^[\w\.-]+@[\w\.-]+\.[a-zA-Z]{2,}$")
+_PHONE_RE = re.compile(r"^[+\d][\d\s()-]{6,}$")
+_TIME_RE = re.compile(r"^(\d{1,2}):(\d{2})$")
+
+RESERVATION_FIELDS = ('name', 'guests', 'date', 'time', 'email', 'phone', 'special_requests')
+
+
+class InvalidReservation(ValueError):
+    """`errors` maps each bad field to a short reason."""
+
+    def __init__(self, errors: dict):
+        super().__init__("Invalid reservation: " + ", ".join(f"{k} {v}" for k, v in errors.items()))
+        self.errors = errors
+
+
+def is_valid_email(email: str) -> bool:
+    return _EMAIL_RE.match(email) is not None
+
+
+def is_valid_phone(phone: str) -> bool:
+    return _PHONE_RE.match(phone) is not None
+
+
+def is_within_hours(t: time, opening: time = OPENING_TIME, closing: time = CLOSING_TIME) -> bool:
+    return opening <= t <= closing
+
+
+def validate_reservation(data, partial: bool = False, opening: time = OPENING_TIME,
+                         closing: time = CLOSING_TIME) -> dict:
+    """
+    Normalized reservation fields from untrusted input (API bodies, imports).
+
+    With partial=True only the fields present are checked. Raises
+    InvalidReservation listing every bad field.
+    """
+    if not isinstance(data, dict):
+        raise InvalidReservation({'body': "must be an object"})
+    errors, out = {}, {}
+    for field in RESERVATION_FIELDS:
+        if field not in data:
+            if not partial and field != 'special_requests':
+                errors[field] = "required"
+            continue
+        value = data[field]
+        if field == 'guests':
+            max_party = get_config().max_party()
+            if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+                errors[field] = "must be a positive integer"
+            elif value > max_party:
+                errors[field] = f"we take bookings for up to {max_party} guests"
+            else:
+                out[field] = value
+            continue
+        if not isinstance(value, str):
+            errors[field] = "must be a string"
+            continue
+        value = value.strip()
+        if field == 'name' and not value:
+            errors[field] = "required"
+        elif field == 'date':
+            try:
+                if len(value) != 10:  # why: fromisoformat also takes 20300101 and week dates
+                    raise ValueError(value)
+                datetime.date.fromisoformat(value)
+            except ValueError:
+                errors[field] = "use YYYY-MM-DD"
+        elif field == 'time':
+            match = _TIME_RE.match(value)
+            try:
+                t = time(int(match.group(1)), int(match.group(2))) if match else None
+            except ValueError:
+                t = None
+            if t is None:
+                errors[field] = "use HH:MM"
+            elif not is_within_hours(t, opening, closing):
+                errors[field] = f"we are open {opening:%H:%M}-{closing:%H:%M}"
+            else:
+                value = f"{t:%H:%M}"
+        elif field == 'email' and not is_valid_email(value):
+            errors[field] = "invalid email"
+        elif field == 'phone' and not is_valid_phone(value):
+            errors[field] = "invalid phone number"
+        if field not in errors:
+            out[field] = value
+    if errors:
+        raise InvalidReservation(errors)
+    if not partial:
+        out.setdefault('special_requests', '')
+    return out
@@ -0,0 +1,206 @@
+"""
+Venues (tenancy).
+
+- Each venue has its own hours, floor plan, contact details and SQLite shard,
+  so one location's writes never contend with another's
+- activate(venue) points db.py and capacity.py at that venue for the current
+  thread/task; pools stay cached per shard in db.py
+- fan_out() runs a function against every shard in parallel, for group-wide
+  reporting
+
+Venues come from the JSON file named by RESTAURANT_VENUES, a list like:
+
+    [{"slug": "downtown", "name": "Downtown", "address": "1 Main St", "phone": "(555) 010-0000",
+      "opening": "11:00", "closing": "22:00", "tables": "2x6,4x8", "db": "data/downtown.db"}]
+
+Without it there is one venue, "main", on RESERVATIONS_DB as before.
+
+    python venues.py report --from 2030-01-01 --to 2030-01-31
+    python venues.py maintain        # archive.py's maintenance on every shard
+
+The single-database CLIs (archive.py, export.py, importer.py) take --venue
+so they open a shard with that venue's floor plan, not the process default.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import time
+
+import archive
+import capacity
+import db
+from capacity import CapacityConfig
+from validation import CLOSING_TIME, OPENING_TIME
+
+_SLUG_RE = re.compile(r"^[a-z0-9][a-z0-9-]{0,39}$")
+
+
+@dataclass(frozen=True)
+class Venue:
+    slug: str
+    name: str
+    address: str = ""
+    phone: str = ""
+    opening: time = OPENING_TIME
+    closing: time = CLOSING_TIME
+    days: str = "7 days a week"
+    capacity_config: CapacityConfig = None  # None: capacity's process default
+    db_path: str = None  # None: db.DB_PATH
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        slug = data['slug']
+        if not _SLUG_RE.match(slug):
+            raise ValueError(f"Venue slug must be lowercase letters, digits and dashes: {slug!r}")
+        default = capacity.get_config()
+        return cls(
+            slug=slug,
+            name=data.get('name', slug),
+            address=data.get('address', ""),
+            phone=data.get('phone', ""),
+            opening=time.fromisoformat(data.get('opening', f"{OPENING_TIME:%H:%M}")),
+            closing=time.fromisoformat(data.get('closing', f"{CLOSING_TIME:%H:%M}")),
+            days=data.get('days', "7 days a week"),
+            capacity_config=CapacityConfig(
+                tables=capacity.parse_tables(data['tables']) if data.get('tables') else default.tables,
+                slot_minutes=int(data.get('slot_minutes', default.slot_minutes)),
+                turn_minutes=int(data.get('turn_minutes', default.turn_minutes)),
+            ),
+            db_path=data.get('db') or os.path.join(os.path.dirname(db.DB_PATH) or '.', f"{slug}.db"),
+        )
+
+
+DEFAULT_VENUE = Venue(
+    slug='main',
+    name="Fine Dining Restaurant",
+    address="123 Gourmet Avenue, Foodie District",
+    phone="(555) 123-4567",
+)
+
+
+def load_venues(path: str = None) -> dict:
+    """{slug: Venue} from a JSON file, in file order; the default venue if no file is configured."""
+    path = path or os.environ.get('RESTAURANT_VENUES')
+    if not path:
+        return {DEFAULT_VENUE.slug: DEFAULT_VENUE}
+    with open(path, encoding='utf-8') as f:
+        venues = [Venue.from_dict(item) for item in json.load(f)]
+    if not venues:
+        raise ValueError(f"No venues in {path}")
+    by_slug = {v.slug: v for v in venues}
+    if len(by_slug) != len(venues):
+        raise ValueError(f"Duplicate venue slug in {path}")
+    if len({v.db_path for v in venues}) != len(venues):
+        raise ValueError(f"Two venues share a database file in {path}")
+    return by_slug
+
+
+VENUES = load_venues()
+_current = ContextVar('venue', default=None)
+
+
+def all_venues():
+    return list(VENUES.values())
+
+
+def get_venue(slug: str = None) -> Venue:
+    """The venue for `slug`; the first configured venue if slug is None. KeyError if unknown."""
+    if slug is None:
+        return next(iter(VENUES.values()))
+    return VENUES[slug]
+
+
+def current() -> Venue:
+    """The venue activated in this context, else the first configured one."""
+    return _current.get() or get_venue()
+
+
+@contextmanager
+def activate(venue: Venue):
+    """Route db.py and capacity.py to `venue` for this thread/task."""
+    with ExitStack() as stack:
+        stack.enter_context(db.use_database(venue.db_path))
+        if venue.capacity_config is not None:
+            stack.enter_context(capacity.use_config(venue.capacity_config))
+        token = _current.set(venue)
+        stack.callback(_current.reset, token)
+        yield venue
+
+
+def run_in(venue: Venue, fn, *args, **kwargs):
+    with activate(venue):
+        return fn(*args, **kwargs)
+
+
+# ---------- Cross-shard ----------
+
+def fan_out(fn, *args, venues=None, **kwargs) -> dict:
+    """{slug: fn(*args, **kwargs)} run against every venue's shard in parallel."""
+    venues = list(venues or all_venues())
+    if len(venues) == 1:
+        return {venues[0].slug: run_in(venues[0], fn, *args, **kwargs)}
+    # why: shards are separate files, so reads never wait on each other's locks
+    with ThreadPoolExecutor(max_workers=min(len(venues), 16), thread_name_prefix="venue-fan-out") as pool:
+        futures = {v.slug: pool.submit(run_in, v, fn, *args, **kwargs) for v in venues}
+        return {slug: future.result() for slug, future in futures.items()}
+
+
+def maintain_all():
+    """archive.maintain() on every shard (the scheduler job)."""
+    return fan_out(archive.maintain, interval_hours=archive.MAINTENANCE_HOURS)
+
+
+def report(date_from: str, date_to: str) -> dict:
+    """Bookings and covers per day, per venue and group-wide."""
+    per_venue = fan_out(db.daily_totals, date_from, date_to)
+    totals = {}
+    for rows in per_venue.values():
+        for date, bookings, covers in rows:
+            b, c = totals.get(date, (0, 0))
+            totals[date] = (b + bookings, c + covers)
+    return {
+        'venues': {
+            slug: [{'date': d, 'bookings': b, 'covers': c} for d, b, c in rows] for slug, rows in per_venue.items()
+        },
+        'total': [{'date': d, 'bookings': b, 'covers': c} for d, (b, c) in sorted(totals.items())],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Venues and group-wide reporting.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help='show configured venues')
+    sub.add_parser('maintain', help='archive and optimize every venue database now')
+    rep = sub.add_parser('report', help='bookings and covers per day across all venues')
+    today = datetime.date.today()
+    rep.add_argument('--from', dest='date_from', default=today.isoformat())
+    rep.add_argument('--to', dest='date_to', default=(today + datetime.timedelta(days=30)).isoformat())
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        for v in all_venues():
+            print(f"{v.slug:<16}{v.name:<32}{v.opening:%H:%M}-{v.closing:%H:%M}  {v.db_path or db.DB_PATH}")
+        return
+    if args.command == 'maintain':
+        for slug, moved in fan_out(archive.maintain).items():
+            print(f"{slug}: archived {moved} reservations")
+        return
+    result = report(args.date_from, args.date_to)
+    slugs = list(result['venues'])
+    by_venue = {slug: {r['date']: r for r in rows} for slug, rows in result['venues'].items()}
+    print(f"{'date':<12}" + "".join(f"{s[:14]:>16}" for s in slugs) + f"{'total':>16}")
+    for row in result['total']:
+        cells = [by_venue[s].get(row['date'], {'bookings': 0, 'covers': 0}) for s in slugs]
+        print(f"{row['date']:<12}" + "".join(f"{c['bookings']:>7}/{c['covers']:<8}" for c in cells)
+              + f"{row['bookings']:>7}/{row['covers']:<8}")
+
+
+if __name__ == '__main__':
+    main()
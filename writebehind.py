@@ -0,0 +1,143 @@
+"""
+Group-commit writer.
+
+A background thread drains queued write operations from every session and
+applies them in one transaction per batch window, so a burst of bookings
+pays for one commit (and one fsync) instead of one each. Every caller gets a
+concurrent.futures.Future that resolves only after its batch has committed,
+with the operation's return value or its exception.
+
+Each operation runs inside its own SAVEPOINT, so one failing write (say a
+full slot) is rolled back alone and the rest of the batch still commits.
+"""
+
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+
+_STOP = object()
+
+
+def _begin_immediate(conn):
+    conn.execute("BEGIN IMMEDIATE")
+
+
+class GroupCommitWriter:
+    def __init__(self, pool, window_ms: float = 5.0, max_batch: int = 256, begin=_begin_immediate):
+        self.pool = pool
+        self.begin = begin  # why: db.begin_immediate, with its lock retries; passed in since db imports this module
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, op) -> Future:
+        """Queue `op(conn)`; the future resolves once its batch is committed."""
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((op, future))
+        return future
+
+    def stop(self, timeout: float = 5.0):
+        """Flush pending writes, stop the thread and forget this writer."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+        with _writers_lock:
+            if self in _writers:
+                _writers.remove(self)
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            with metrics.span('db_op_seconds', op='group_commit'):
+                self._commit(batch)
+            metrics.count('db_group_commit_ops_total', len(batch))
+            if stop:
+                return
+
+    def _commit(self, batch):
+        outcomes = []
+        conn = None
+        try:
+            conn = self.pool.acquire()
+            self.begin(conn)
+            for op, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT write_op")
+                try:
+                    outcomes.append((future, op(conn), None))
+                    conn.execute("RELEASE write_op")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_op")
+                    conn.execute("RELEASE write_op")
+                    outcomes.append((future, None, e))
+            conn.commit()
+        except Exception as e:
+            if conn is not None and conn.in_transaction:
+                conn.rollback()
+            # why: a failed acquire or BEGIN leaves futures pending; every caller must still get an answer
+            for op, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            if conn is not None:
+                self.pool.release(conn)
+        # why: resolve only after commit, so a resolved future means the write is durable
+        for future, value, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
+
+
+_writers = []  # running writers, flushed at exit; stop() removes them
+_writers_lock = threading.Lock()
+
+
+@atexit.register
+def _flush_all():
+    with _writers_lock:
+        writers = list(_writers)
+    for writer in writers:
+        writer.stop()
+
+
+def start_writer(pool, window_ms: float = 5.0, max_batch: int = 256, begin=_begin_immediate) -> GroupCommitWriter:
+    writer = GroupCommitWriter(pool, window_ms=window_ms, max_batch=max_batch, begin=begin)
+    with _writers_lock:
+        _writers.append(writer)
+    return writer